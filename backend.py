@@ -1,23 +1,53 @@
 # main.py
 import os
 import uuid
-import re
-from io import BytesIO
+import hashlib
+import threading
 from typing import List , Union, Dict
 import pandas as pd
 import numpy as np
-import boto3
-from fastapi import FastAPI, HTTPException, Query
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi import FastAPI, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import json
 from redis_client import redis_client
 import redis
-from typing import Any, Dict
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+import tempfile
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from pivot_engine import (
+    bincount_pivot_table, UnsupportedPivot, ColumnIndexCache, build_column_index,
+    StreamingAggregator
+)
+from dataset_store import DatasetStore, parquet_schema, parquet_stream_types, to_arrow
+from ingest import (
+    read_csv_table, scan_csv_types, concat_parts, optimize_table, restore_table,
+    CsvTypeMismatch, IngestProgress
+)
+import s3_source
+from dataset_profile import profile_table, profile_parquet, estimate_pivot_size
+from formula_engine import (
+    FormulaError, FormulaPlanCache, evaluation_order, formula_references, frame_schema,
+    is_aggregate, split_aggregate
+)
+from lru_cache import LRUCache
+from filter_engine import FilterError, PRUNABLE_OPS, RowFilter, make_filter, select_rows
+from compute_pool import BoundedProcessPool, PoolSaturated, PoolUnavailable
 
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    _recover_catalog()
+    threading.Thread(target=_catalog_keeper, name="catalog-keeper", daemon=True).start()
+    yield
+
+app = FastAPI(lifespan=lifespan)
 
 r = redis.Redis(host="localhost", port=6379, db=0, decode_responses=True)
 
@@ -30,10 +60,46 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory storage
-DATASETS = {}
-DATASET_META = {}
-ACTIVE_DATASET_ID = None
+# Datasets live in memory-mapped Arrow files shared by every worker on the
+# host; DATASET_META is the on-disk catalog next to them (id -> metadata).
+DATASET_STORE_DIR = os.getenv(
+    "DATASET_STORE_DIR", os.path.join(tempfile.gettempdir(), "fastapi_dash_store")
+)
+# Budget for columns materialized from lazily registered parquet datasets (per process)
+LAZY_COLUMN_MAX_BYTES = int(os.getenv("LAZY_COLUMN_MAX_BYTES", 1024 * 1024 * 1024))
+# Budget for attached dataset frames (per process); least recently used ones
+# are detached and mapped back from their Arrow file when touched. 0 = no limit
+DATASET_MEMORY_BUDGET = int(os.getenv("DATASET_MEMORY_BUDGET", 4 * 1024 * 1024 * 1024))
+DATASETS = DatasetStore(DATASET_STORE_DIR, LAZY_COLUMN_MAX_BYTES, DATASET_MEMORY_BUDGET)
+DATASET_META = DATASETS.catalog
+ACTIVE_DATASET_ID = None   # legacy fallback for pivot requests without dataset_id
+
+# Streaming CSV ingest: block size for the Arrow reader and per-dataset progress
+CSV_BLOCK_SIZE = int(os.getenv("CSV_BLOCK_SIZE", 8 * 1024 * 1024))
+INGEST_PROGRESS = IngestProgress()
+
+# Shrink in-memory datasets at registration: parse date columns, dictionary-
+# encode text columns with at most CATEGORY_MAX_RATIO distinct values per
+# row, downcast integers
+DTYPE_OPTIMIZE = os.getenv("DTYPE_OPTIMIZE", "1") == "1"
+CATEGORY_MAX_RATIO = float(os.getenv("CATEGORY_MAX_RATIO", 0.5))
+
+# Column profiles kept in the catalog: most frequent values listed per column
+PROFILE_TOP_K = int(os.getenv("PROFILE_TOP_K", 20))
+
+# Registration jobs run here; several sources can load in parallel (the Arrow
+# readers release the GIL) while the API keeps serving requests.
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 2))
+INGEST_POOL = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+
+# Warm restart: the catalog and the Arrow files outlive the process, so a
+# restarted worker maps datasets back on first use. Loads in progress touch
+# their catalog entry every INGEST_HEARTBEAT_S; an entry left "loading" for
+# INGEST_STALE_S lost its worker and is resumed from its source descriptor.
+INGEST_HEARTBEAT_S = float(os.getenv("INGEST_HEARTBEAT_S", 10))
+INGEST_STALE_S = float(os.getenv("INGEST_STALE_S", 60))
+_LOADING = set()   # registration jobs queued or running in this process
+_LOADING_LOCK = threading.Lock()
 
 # -----------------------------
 # Request Models
@@ -48,6 +114,8 @@ class DatasetRequest(BaseModel):
     file_format: str          # parquet | csv
     s3: S3Source | None = None
     local_path: str | None = None
+    lazy: bool = False        # parquet only: read columns on first use instead of up front
+    stream: bool = False      # out-of-core: never load, pivots stream the file in batches
 
 class CalculatedField(BaseModel):
     name: str
@@ -55,12 +123,18 @@ class CalculatedField(BaseModel):
 
 class FilterItem(BaseModel):
     column: str
+    op: str = "eq"            # eq | in | not_in | range | contains | is_null | not_null
+    value: Any = None         # eq / contains (eq with a list means in)
+    values: List[Any] = []    # in / not_in
+    min: Any = None           # range bounds, inclusive; either may be omitted
+    max: Any = None
 
 class PivotRequest(BaseModel):
+    dataset_id: str | None = None   # omitted -> last activated dataset (single worker only)
     rows: List[str] = []
     columns: List[str] = []
     values: List[str] = []
-    aggfunc: Union[str, Dict[str, str]] = "sum"
+    aggfunc: Union[str, Dict[str, str]] = "sum"   # one for all values, or per value column
     calculated_fields: List[CalculatedField] = []
     filters: List[FilterItem] = []
 
@@ -75,148 +149,339 @@ class ReportPayload(BaseModel):
 # -----------------------------
 # Helpers: Loading datasets
 # -----------------------------
-def load_dataset_from_source(req: DatasetRequest) -> pd.DataFrame:
+def _open_source(req: DatasetRequest):
+    """
+    Returns (open_stream, total_bytes) for the request's file; every call
+    to open_stream() starts a fresh read from the beginning.
+    """
     if req.source_type == "s3":
-        s3 = boto3.client("s3")
+        s3 = s3_source.get_client()
         try:
             obj = s3.get_object(Bucket=req.s3.bucket, Key=req.s3.key)
-            body = obj["Body"].read()
         except Exception as e:
             raise HTTPException(400, f"Failed to read S3 object: {e}")
-        if req.file_format.lower() == "parquet":
-            return pd.read_parquet(BytesIO(body))
-        else:
-            return pd.read_csv(BytesIO(body))
+        first = [obj["Body"]]
+
+        def open_stream():
+            if first:
+                return first.pop()
+            return s3.get_object(Bucket=req.s3.bucket, Key=req.s3.key)["Body"]
+        return open_stream, obj.get("ContentLength")
     elif req.source_type == "local":
         if not req.local_path or not os.path.exists(req.local_path):
             raise HTTPException(400, "Local file not found")
-        if req.file_format.lower() == "parquet":
-            return pd.read_parquet(req.local_path)
+        return (lambda: open(req.local_path, "rb")), os.path.getsize(req.local_path)
+    raise HTTPException(400, "Invalid source_type or file_format")
+
+def _load_s3_objects(req: DatasetRequest, objects, dataset_id: str | None) -> List[pa.Table]:
+    """
+    Parallel ranged download of every part under an S3 prefix (or a single
+    parquet object). Each part is parsed as soon as it arrives; returns one
+    table per object, in object order, for concat_parts.
+    """
+    s3 = s3_source.get_client()
+    fmt = req.file_format.lower()
+    tables = {}
+    counters = {"bytes": 0, "rows": 0}
+    lock = threading.Lock()
+
+    def on_bytes(n):
+        with lock:
+            counters["bytes"] += n
+            done, rows = counters["bytes"], counters["rows"]
+        if dataset_id:
+            INGEST_PROGRESS.update(dataset_id, done, rows)
+
+    def on_object(obj, buf):
+        reader = lambda: pa.BufferReader(pa.py_buffer(buf))
+        if fmt == "parquet":
+            table = pq.read_table(reader())
+            table = table.drop_columns([c for c in table.column_names if c.startswith("__index_level_")])
         else:
-            return pd.read_csv(req.local_path)
+            try:
+                table = read_csv_table(reader, block_size=CSV_BLOCK_SIZE)
+            except CsvTypeMismatch:
+                table = pa.Table.from_pandas(pd.read_csv(reader()), preserve_index=False)
+        with lock:
+            tables[obj.key] = table
+            counters["rows"] += table.num_rows
+            done, rows = counters["bytes"], counters["rows"]
+        if dataset_id:
+            INGEST_PROGRESS.update(dataset_id, done, rows)
+
+    try:
+        s3_source.fetch_objects(s3, req.s3.bucket, objects, on_object, on_bytes)
+    except Exception as e:
+        raise HTTPException(400, f"Failed to read S3 object: {e}")
+    return [tables[obj.key] for obj in objects]
+
+def _list_source(req: DatasetRequest) -> List[s3_source.S3Object]:
+    """
+    The source's files in load order, each with a change token: the S3
+    ETag, or the modification time and size of a local file.
+    """
+    if req.source_type == "s3" and req.s3 is not None:
+        try:
+            objects = s3_source.list_objects(s3_source.get_client(), req.s3.bucket, req.s3.key)
+        except Exception as e:
+            raise HTTPException(400, f"Failed to list S3 prefix: {e}")
+        if not objects:
+            raise HTTPException(400, f"No objects found under s3://{req.s3.bucket}/{req.s3.key}")
+        return objects
+    if req.source_type == "local":
+        if not req.local_path or not os.path.exists(req.local_path):
+            raise HTTPException(400, "Local file not found")
+        st = os.stat(req.local_path)
+        return [s3_source.S3Object(os.path.abspath(req.local_path), st.st_size,
+                                   f"{st.st_mtime_ns:x}-{st.st_size:x}")]
     raise HTTPException(400, "Invalid source_type or file_format")
 
+def _loads_parts(req: DatasetRequest, objects) -> bool:
+    """S3 prefixes and parquet objects are fetched and parsed one part per object."""
+    return req.source_type == "s3" and (len(objects) > 1 or req.file_format.lower() == "parquet")
+
+def load_dataset_from_source(req: DatasetRequest, dataset_id: str | None = None,
+                             objects=None) -> Union[pd.DataFrame, pa.Table]:
+    """
+    CSVs are streamed through the multithreaded Arrow reader and come back
+    as a pa.Table; progress is reported under dataset_id when given.
+    Parquet files are read straight into a pa.Table (no pandas round trip).
+    An S3 key that is not an object is loaded as a prefix of part files.
+    Pass objects (from _list_source) to load exactly that listing.
+    """
+    if req.source_type == "s3" and req.s3 is not None:
+        if objects is None:
+            objects = _list_source(req)
+        if dataset_id:
+            INGEST_PROGRESS.set_total(dataset_id, sum(obj.size for obj in objects))
+        if _loads_parts(req, objects):
+            return concat_parts(_load_s3_objects(req, objects, dataset_id))
+
+    open_stream, total = _open_source(req)
+    if dataset_id:
+        INGEST_PROGRESS.set_total(dataset_id, total)
+    if req.file_format.lower() == "parquet":
+        if req.source_type == "local":
+            table = pq.read_table(req.local_path)
+        else:
+            with open_stream() as fh:
+                table = pq.read_table(pa.BufferReader(pa.py_buffer(fh.read())))
+        return table.drop_columns([c for c in table.column_names if c.startswith("__index_level_")])
+
+    def on_progress(bytes_read, rows_read):
+        if dataset_id:
+            INGEST_PROGRESS.update(dataset_id, bytes_read, rows_read)
+    try:
+        return read_csv_table(open_stream, on_progress, block_size=CSV_BLOCK_SIZE)
+    except CsvTypeMismatch:
+        # columns that mix types beyond what widening covers; let pandas decide
+        with open_stream() as fh:
+            return pd.read_csv(fh)
+
 
 # -----------------------------
-# QuickSight -> Pandas expression engine
+# Calculated fields (QuickSight-style formulas, see formula_engine)
 # -----------------------------
-_re_field = re.compile(r"\{(.*?)\}")
-_token_re = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
-
 def is_numeric_dtype(dtype):
-    return np.issubdtype(dtype, np.number)
-
-def _replace_field_tokens(expr: str):
-    return _re_field.sub(lambda m: f'df["{m.group(1)}"]', expr)
-
-def _split_args(s: str):
-    parts = []
-    current = []
-    depth = 0
-    in_quote = False
-    quote_char = None
-    i = 0
-    while i < len(s):
-        ch = s[i]
-        if in_quote:
-            current.append(ch)
-            if ch == quote_char:
-                in_quote = False
-                quote_char = None
-        else:
-            if ch in ("'", '"'):
-                in_quote = True
-                quote_char = ch
-                current.append(ch)
-            elif ch == "(":
-                depth += 1
-                current.append(ch)
-            elif ch == ")":
-                depth -= 1
-                current.append(ch)
-            elif ch == "," and depth == 0:
-                part = "".join(current).strip()
-                if part:
-                    parts.append(part)
-                current = []
-            else:
-                current.append(ch)
-        i += 1
-    last = "".join(current).strip()
-    if last:
-        parts.append(last)
-    return parts
-
-def _translate_functions(expr: str, df: pd.DataFrame, valid_fields: set):
-    src = expr
-    src = re.sub(r"(?i)\bifelse\s*\(", "np.where(", src)
-    src = re.sub(r"(?i)\bisnull\s*\(", "pd.isnull(", src)
-    src = re.sub(r"(?i)\bisnotnull\s*\(", "pd.notnull(", src)
-
-    def _coalesce_repl(match):
-        inside = match.group(1)
-        parts = [p.strip() for p in _split_args(inside)]
-        expr = parts[0]
-        for p in parts[1:]:
-            expr = f"({expr}).fillna({p})"
-        return expr
-    src = re.sub(r"(?i)\bcoalesce\s*\((.*?)\)", _coalesce_repl, src, flags=re.DOTALL)
-
-    src = re.sub(r"(?i)\babs\s*\(", "np.abs(", src)
-    src = re.sub(r"(?i)\bceil\s*\(", "np.ceil(", src)
-    src = re.sub(r"(?i)\bfloor\s*\(", "np.floor(", src)
-    src = re.sub(r"(?i)\bround\s*\(", "np.round(", src)
-    src = re.sub(r"(?i)\bln\s*\(", "np.log(", src)
-    src = re.sub(r"(?i)\bpow\s*\(", "np.power(", src)
-
-    # String
-    src = re.sub(r"(?i)\bupper\s*\(\s*(df\[[^\]]+\])\s*\)", r"\1.str.upper()", src)
-    src = re.sub(r"(?i)\blower\s*\(\s*(df\[[^\]]+\])\s*\)", r"\1.str.lower()", src)
-    src = re.sub(r"(?i)\btrim\s*\(\s*(df\[[^\]]+\])\s*\)", r"\1.str.strip()", src)
-    src = re.sub(r"(?i)\blen\s*\(\s*(df\[[^\]]+\])\s*\)", r"\1.str.len()", src)
-    src = re.sub(r"(?i)\bcontains\s*\(\s*(df\[[^\]]+\])\s*,\s*([^,\)]+)\s*\)", r"\1.str.contains(\2)", src)
-    src = re.sub(r"(?i)\bstartswith\s*\(\s*(df\[[^\]]+\])\s*,\s*([^,\)]+)\s*\)", r"\1.str.startswith(\2)", src)
-    src = re.sub(r"(?i)\bendswith\s*\(\s*(df\[[^\]]+\])\s*,\s*([^,\)]+)\s*\)", r"\1.str.endswith(\2)", src)
-    src = re.sub(r"(?i)\breplace\s*\(\s*(df\[[^\]]+\])\s*,\s*([^,\)]+)\s*,\s*([^,\)]+)\s*\)", r"\1.str.replace(\2,\3)", src)
-
-    def _concat_repl(m):
-        inner = m.group(1)
-        parts = [p.strip() for p in _split_args(inner)]
-        conv = [f"({p}).astype(str)" for p in parts]
-        return " + ".join(conv)
-    src = re.sub(r"(?i)\bconcat\s*\((.*?)\)", _concat_repl, src, flags=re.DOTALL)
-
-    src = re.sub(r"(?i)\bparseDate\s*\(", "pd.to_datetime(", src)
-    src = re.sub(r"(?i)\bAND\b", "&", src)
-    src = re.sub(r"(?i)\bOR\b", "|", src)
-    src = re.sub(r"(?i)\bNOT\b", "~", src)
-
-    return src
-
-def apply_calculated_fields(df: pd.DataFrame, calc_fields: List[CalculatedField]) -> pd.DataFrame:
-    valid_fields = set(df.columns.tolist())
+    try:
+        return np.issubdtype(dtype, np.number)
+    except TypeError:
+        # pandas extension dtypes (Arrow strings, categoricals, nullable ints)
+        return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+# Compiled formula plans, keyed by formula text and frame schema
+FORMULA_PLAN_CACHE_SIZE = int(os.getenv("FORMULA_PLAN_CACHE_SIZE", 1024))
+FORMULA_PLANS = FormulaPlanCache(FORMULA_PLAN_CACHE_SIZE)
+
+# Evaluated calculated-field columns over whole stored datasets
+CALC_COLUMN_CACHE_MAX_BYTES = int(os.getenv("CALC_COLUMN_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+class DerivedColumnCache:
+    """
+    Evaluated calculated fields bounded by a byte budget (LRU). Keys are
+    (dataset_id, version, normalized formula, dependency keys); each entry
+    remembers how long it took to evaluate so hits report time saved.
+    """
+
+    def __init__(self, max_bytes: int):
+        self._lru = LRUCache(max_bytes)   # key -> (column, seconds)
+        self.seconds_saved = 0.0
+        self.seconds_spent = 0.0
+
+    def get(self, key: tuple, rows: int | None = None):
+        """The cached column; rows is how many of its rows the caller uses."""
+        with self._lru.lock:
+            entry = self._lru.get(key)
+            if entry is None:
+                return None
+            column, seconds = entry
+            share = 1.0 if rows is None or not len(column) else min(rows / len(column), 1.0)
+            self.seconds_saved += seconds * share
+            return column
+
+    def put(self, key: tuple, column, seconds: float):
+        if not isinstance(column, pd.Series):
+            return   # scalars (constant formulas) are cheaper to recompute
+        nbytes = int(column.memory_usage(index=False, deep=True))
+        with self._lru.lock:
+            self.seconds_spent += seconds
+            self._lru.put(key, (column, seconds), nbytes)
+
+    def drop(self, dataset_id: str):
+        """Forget every column evaluated over dataset_id."""
+        self._lru.discard(lambda key: key[0] == dataset_id)
+
+    def stats(self) -> Dict[str, Any]:
+        lru = self._lru
+        with lru.lock:
+            per_dataset: Dict[str, Dict[str, int]] = {}
+            for (ds, _, formula, _), _, size in lru.items():
+                columns = per_dataset.setdefault(ds, {})
+                columns[formula] = columns.get(formula, 0) + size
+            return {
+                "entries": len(lru),
+                "bytes": lru.size,
+                "max_bytes": lru.max_size,
+                "hits": lru.hits,
+                "misses": lru.misses,
+                "evictions": lru.evictions,
+                "seconds_saved": round(self.seconds_saved, 3),
+                "seconds_spent": round(self.seconds_spent, 3),
+                "datasets": per_dataset,
+            }
+
+DERIVED_COLUMNS = DerivedColumnCache(CALC_COLUMN_CACHE_MAX_BYTES)
+
+def apply_calculated_fields(df: pd.DataFrame, calc_fields: List[CalculatedField],
+                            dataset: tuple | None = None, positions=None) -> pd.DataFrame:
+    """
+    Add each calculated field as a column, in list order (dependencies
+    first, see _plan_calculated_fields). dataset is (dataset_id, version)
+    when df comes from the stored frame: with every stored row (positions
+    None) the evaluated columns are cached for later requests; otherwise df
+    holds the stored rows at positions and cached columns are sliced to them.
+    """
+    keys: Dict[str, tuple] = {}   # calculated field -> cache key of its column
+    date_formats = DATASET_META[dataset[0]].get("date_formats") if dataset is not None else None
     for field in calc_fields:
-        expr = field.formula.strip()
-        if not expr:
+        if not field.formula.strip():
             raise HTTPException(400, f"Calculated field '{field.name}' has empty formula")
-        expr = _replace_field_tokens(expr)
-        tokens = _token_re.findall(expr)
-        for tok in sorted(set(tokens), key=lambda x: -len(x)):
-            if tok in valid_fields:
-                expr = re.sub(rf'(?<!df\["|df\[\')\b{re.escape(tok)}\b', f'df["{tok}"]', expr)
-        expr = _translate_functions(expr, df, valid_fields)
         try:
-            result = eval(expr, {"__builtins__": {}}, {"np": np, "pd": pd, "df": df})
-        except Exception as e:
-            try:
-                result = pd.eval(expr, engine="python", local_dict={"df": df, "np": np, "pd": pd})
-            except Exception as e2:
-                raise HTTPException(400, f"Calculated field '{field.name}' failed: {e}; fallback pd.eval error: {e2}")
-        df[field.name] = result
-        valid_fields.add(field.name)
+            plan = FORMULA_PLANS.get(field.formula, frame_schema(df))
+            key = None
+            if dataset is not None:
+                # inputs that are calculated fields stand for their own formula
+                deps = tuple(sorted((c, keys.get(c, ())) for c in plan.columns))
+                key = keys[field.name] = (*dataset, plan.normalized, deps)
+            if plan.reference is not None:
+                key = None   # a plain column: nothing to save
+            column = DERIVED_COLUMNS.get(key, len(df)) if key is not None else None
+            if column is not None and positions is not None:
+                column = column.iloc[positions].set_axis(df.index)
+            if column is None:
+                started = time.perf_counter()
+                column = plan.evaluate(df, date_formats)
+                if key is not None and positions is None:
+                    DERIVED_COLUMNS.put(key, column, time.perf_counter() - started)
+            df[field.name] = column
+        except FormulaError as e:
+            raise HTTPException(400, f"Calculated field '{field.name}' failed: {e}")
     return df
 
+# -----------------------------
+# NULL / EMPTY handling for dimension keys
+# -----------------------------
+NULL_LABEL = "null"
+EMPTY_LABEL = "empty"
+EMPTY_KEY = "__EMPTY__"   # internal group key for blank strings (sorts like before)
+TOTAL_KEY = "__TOTAL__"   # constant row dimension of the grand-total pass
+
+def _blank_mask(s: pd.Series) -> pd.Series:
+    """Vectorized mask of empty / whitespace-only string cells (False for non-strings)."""
+    if is_numeric_dtype(s.dtype) or pd.api.types.is_datetime64_any_dtype(s.dtype):
+        return pd.Series(False, index=s.index)
+    try:
+        return s.str.strip().eq("").fillna(False).astype(bool)
+    except AttributeError:
+        # object column without any string values
+        return pd.Series(False, index=s.index)
+
+def _normalize_dimensions(df: pd.DataFrame, dims: List[str]) -> pd.DataFrame:
+    """
+    Collapse blank strings to EMPTY_KEY on the grouped dimension columns only.
+    Nulls stay real NaN/None (grouped with dropna=False) and every other
+    column keeps its dtype; categorical dimensions are grouped as plain
+    values. Returns a shallow copy if anything changed.
+    """
+    out = df
+    for col in dims:
+        if col not in df.columns:
+            continue
+        s = df[col]
+        categorical = isinstance(s.dtype, pd.CategoricalDtype)
+        if categorical:
+            s = s.astype(object)
+        blank = _blank_mask(s)
+        if blank.any():
+            s = s.mask(blank, EMPTY_KEY)
+        if categorical or blank.any():
+            if out is df:
+                out = df.copy(deep=False)
+            out[col] = s
+    return out
+
+def _key_label(v):
+    if v is None or (isinstance(v, float) and np.isnan(v)) or v is pd.NaT or v is pd.NA:
+        return NULL_LABEL
+    if isinstance(v, str) and v == EMPTY_KEY:
+        return EMPTY_LABEL
+    return v
+
+def _label_column_keys(pivot: pd.DataFrame, has_col_dims: bool,
+                       date_formats: Dict[str, str] = None) -> pd.DataFrame:
+    """
+    Column-dimension half of _label_dimension_keys, applied before
+    reset_index(): a datetime column level cannot take the blank fill of the
+    row dimensions' columns, so date keys are printed as text first.
+    """
+    date_formats = date_formats or {}
+    if has_col_dims and isinstance(pivot.columns, pd.MultiIndex):
+        formats = [date_formats.get(name) for name in pivot.columns.names]
+
+        def _label(v, fmt):
+            if fmt and isinstance(v, pd.Timestamp):
+                return v.strftime(fmt)
+            return _key_label(v)
+        pivot.columns = pd.MultiIndex.from_tuples(
+            [tuple(_label(v, fmt) for v, fmt in zip(t, formats)) for t in pivot.columns],
+            names=pivot.columns.names
+        )
+    return pivot
+
+def _label_dimension_keys(pivot: pd.DataFrame, row_dims: List[str],
+                          date_formats: Dict[str, str] = None) -> pd.DataFrame:
+    """
+    Map null / blank row keys to QuickSight-style labels on the reset pivot
+    output. Dimensions parsed as dates at ingest are printed back in their
+    source format. Column keys are labelled by _label_column_keys.
+    """
+    date_formats = date_formats or {}
+    for col in row_dims:
+        if col not in pivot.columns:
+            continue
+        s = pivot[col]
+        if col in date_formats and pd.api.types.is_datetime64_any_dtype(s.dtype):
+            s = s.dt.strftime(date_formats[col])
+            pivot[col] = s
+        missing = s.isna()
+        blank = s.eq(EMPTY_KEY).fillna(False).astype(bool)
+        if missing.any() or blank.any():
+            pivot[col] = s.astype(object).mask(missing, NULL_LABEL).mask(blank, EMPTY_LABEL)
+    return pivot
+
 def _get_pandas_aggfunc(df: pd.DataFrame, col: str, user_agg: str):
+    # Measures are not null-filled (only dimensions are, see
+    # _normalize_dimensions): "count" counts non-null cells in every engine.
     dtype = df[col].dtype
     agg = (user_agg or "sum").lower()
     if is_numeric_dtype(dtype):
@@ -229,6 +494,211 @@ def _get_pandas_aggfunc(df: pd.DataFrame, col: str, user_agg: str):
             return "count"
         return "count"
 
+# -----------------------------
+# Pivot engines
+# -----------------------------
+# "bincount" (factorize + one vectorized pass, falls back to pandas for
+# shapes it does not cover) or "pandas" (pd.pivot_table)
+PIVOT_ENGINE = os.getenv("PIVOT_ENGINE", "bincount").lower()
+
+# Reject pivots whose estimated output (from the column profiles) exceeds
+# this many cells before any work is done; 0 disables the check
+PIVOT_MAX_CELLS = int(os.getenv("PIVOT_MAX_CELLS", 0))
+
+# Per-column dictionary encodings (codes + sorted uniques) of stored datasets
+COLUMN_INDEX_MAX_BYTES = int(os.getenv("COLUMN_INDEX_MAX_BYTES", 512 * 1024 * 1024))
+# Build indexes for every non-float column at registration instead of on first use
+COLUMN_INDEX_EAGER = os.getenv("COLUMN_INDEX_EAGER", "0") == "1"
+
+COLUMN_INDEXES = ColumnIndexCache(COLUMN_INDEX_MAX_BYTES)
+
+def _build_dimension_index(s: pd.Series):
+    """Encode a column the way it is grouped: blank strings share one key."""
+    blank = _blank_mask(s)
+    if blank.any():
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            s = s.astype(object)
+        return build_column_index(s.mask(blank, EMPTY_KEY), blanks_merged=True)
+    return build_column_index(s)
+
+def _column_index(dataset_id: str, column: str):
+    return COLUMN_INDEXES.get(
+        dataset_id, column, lambda: _build_dimension_index(DATASETS.column(dataset_id, column)),
+        DATASETS.version(dataset_id)
+    )
+
+def _build_dataset_indexes(dataset_id: str):
+    if DATASETS.is_lazy(dataset_id):
+        return   # would read every column; lazy datasets build indexes on first use
+    for col, dtype in DATASETS[dataset_id].dtypes.items():
+        if dtype.kind != "f":
+            _column_index(dataset_id, col)
+
+def _pivot_encoder(dataset_id: str, df: pd.DataFrame, positions, derived: set):
+    """
+    Encoder for the bincount engine: stored columns come from the cached
+    indexes (sliced to the surviving rows), calculated fields are encoded
+    on the fly.
+    """
+    stored = set(DATASETS.columns(dataset_id))
+
+    def encode(col: str, raw: bool):
+        if col in derived or col not in stored:
+            if raw:
+                return None
+            index = _build_dimension_index(df[col])
+            return index.take() if index is not None else None
+        index = _column_index(dataset_id, col)
+        if index is None or (raw and index.blanks_merged):
+            return None
+        return index.take(positions)
+    return encode
+
+def _run_pivot_engine(df: pd.DataFrame, req: PivotRequest, agg_dict: Dict[str, Any],
+                      engine: str, encode=None):
+    """Return (pivot frame, engine actually used)."""
+    if engine == "bincount":
+        try:
+            pivot = bincount_pivot_table(df, req.rows, req.columns, req.values, agg_dict, encode)
+            return pivot, "bincount"
+        except UnsupportedPivot:
+            pass
+    # QuickSight-style NULL & EMPTY handling (dimension keys only)
+    df = _normalize_dimensions(df, (req.rows or []) + (req.columns or []))
+    pivot = pd.pivot_table(
+        df,
+        index=req.rows or None,
+        columns=req.columns or None,
+        values=req.values,
+        aggfunc=agg_dict,
+        fill_value=0,
+        dropna=False
+    )
+    return pivot, "pandas"
+
+def _total_pivot(df: pd.DataFrame, req: PivotRequest, agg_dict: Dict[str, Any],
+                 pivot: pd.DataFrame, engine: str, encode=None):
+    """
+    Grand-total row shaped like pivot (one row, same columns), or None
+    without row dimensions. Sums and counts add up from the grouped cells;
+    averages, extremes and distinct counts are aggregated again over every
+    row with the rows collapsed into one group.
+    """
+    if not req.rows:
+        return None
+    if all(isinstance(agg, str) and agg in ("sum", "count") for agg in agg_dict.values()):
+        # column by column, so integer measures stay integers next to float ones
+        total = pd.DataFrame({i: [pivot.iloc[:, i].sum()] for i in range(pivot.shape[1])})
+        total.columns = pivot.columns
+        return total
+    frame = df.copy(deep=False)
+    frame[TOTAL_KEY] = np.zeros(len(frame), dtype=np.int8)
+    total_encode = None
+    if encode is not None:
+        total_encode = lambda col, raw: None if col == TOTAL_KEY else encode(col, raw)
+    total, _ = _run_pivot_engine(
+        frame, req.model_copy(update={"rows": [TOTAL_KEY]}), agg_dict, engine, total_encode
+    )
+    return total.reindex(columns=pivot.columns)
+
+def _measure_cells(result, n: int) -> pd.Series:
+    """One JSON-safe cell per group: NaN and infinities (x / 0) become None."""
+    s = pd.Series(np.broadcast_to(np.asarray(result), (n,)))
+    if s.dtype.kind == "f":
+        return s.astype(object).where(np.isfinite(s.to_numpy()), None)
+    if s.dtype == object:
+        return s.where(s.notna(), None)
+    return s
+
+def _apply_aggregate_fields(pivot: pd.DataFrame, aggregates, measures: List[str],
+                            has_col_dims: bool) -> pd.DataFrame:
+    """
+    Evaluate aggregate-level fields on a grouped result: each formula runs
+    over the measure cells (one per group and column key, so the cost
+    follows the number of groups), then the measure columns are dropped.
+    """
+    if not has_col_dims:
+        for name, formula in aggregates:
+            plan = FORMULA_PLANS.get(formula, frame_schema(pivot))
+            pivot[name] = _measure_cells(plan.evaluate(pivot), len(pivot)).to_numpy()
+        pivot = pivot.drop(columns=measures)
+        return pivot[sorted(pivot.columns)]
+    keys = pivot[measures[0]].columns
+    grid = {m: pivot[m].reindex(columns=keys) for m in measures}
+    cells = pd.DataFrame({m: g.to_numpy().ravel() for m, g in grid.items()})
+    blocks = [pivot.drop(columns=measures, level=0)]
+    for name, formula in aggregates:
+        plan = FORMULA_PLANS.get(formula, frame_schema(cells))
+        out = _measure_cells(plan.evaluate(cells), len(cells)).to_numpy()
+        block = pd.DataFrame(out.reshape(len(pivot), len(keys)), index=pivot.index)
+        block.columns = pd.MultiIndex.from_tuples(
+            [(name,) + (k if isinstance(k, tuple) else (k,)) for k in keys], names=pivot.columns.names
+        )
+        blocks.append(block)
+    pivot = pd.concat(blocks, axis=1)
+    return pivot[sorted(pivot.columns.get_level_values(0).unique())]
+
+# -----------------------------
+# Pivot result cache
+# -----------------------------
+PIVOT_CACHE_MAX_BYTES = int(os.getenv("PIVOT_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+class PivotResultCache:
+    """LRU of pivot records bounded by an estimated byte budget."""
+
+    def __init__(self, max_bytes: int):
+        self._lru = LRUCache(max_bytes)
+
+    def get(self, key: tuple):
+        return self._lru.get(key)
+
+    def put(self, key: tuple, value, nbytes: int):
+        self._lru.put(key, value, nbytes)
+
+    def invalidate(self, dataset_id: str):
+        """Drop every cached result computed from dataset_id."""
+        self._lru.discard(lambda key: key[0] == dataset_id)
+
+    def stats(self) -> Dict[str, Any]:
+        lru = self._lru
+        with lru.lock:
+            return {
+                "entries": len(lru),
+                "bytes": lru.size,
+                "max_bytes": lru.max_size,
+                "hits": lru.hits,
+                "misses": lru.misses,
+                "evictions": lru.evictions,
+            }
+
+PIVOT_CACHE = PivotResultCache(PIVOT_CACHE_MAX_BYTES)
+
+def _invalidate_dataset_caches(dataset_id: str):
+    """
+    Drop this process's derived state for a dataset. Other workers never
+    serve stale entries because the catalog version is part of their keys.
+    """
+    PIVOT_CACHE.invalidate(dataset_id)
+    COLUMN_INDEXES.drop(dataset_id)
+    DERIVED_COLUMNS.drop(dataset_id)
+
+def _pivot_cache_key(dataset_id: str, req: PivotRequest, user_aggs: Dict[str, str]) -> tuple:
+    """
+    Canonical key for a pivot request. Row/column order defines the output
+    hierarchy and calculated fields may depend on each other, so those keep
+    their order; values, aggfuncs and (AND-ed) filters are order-free.
+    """
+    canonical = {
+        "rows": list(req.rows),
+        "columns": list(req.columns),
+        "values": sorted(req.values),
+        "aggfunc": {c: user_aggs[c].lower() for c in sorted(user_aggs)},
+        "calculated_fields": [[f.name, f.formula.strip()] for f in req.calculated_fields],
+        "filters": sorted(json.dumps(f.model_dump(), sort_keys=True, default=str) for f in req.filters),
+    }
+    digest = hashlib.sha1(json.dumps(canonical, sort_keys=True, default=str).encode()).hexdigest()
+    return (dataset_id, DATASETS.version(dataset_id), digest)
+
 # -----------------------------
 # API endpoints
 # -----------------------------
@@ -236,120 +706,723 @@ def _get_pandas_aggfunc(df: pd.DataFrame, col: str, user_agg: str):
 def root():
     return {"message": "Backend Running ✔"}
 
+def _source_file(dataset_id: str, req: DatasetRequest, version: int) -> str:
+    """
+    Local path of a single-file source: local files are used in place, an
+    S3 object is downloaded once next to the dataset store.
+    """
+    if req.source_type == "local":
+        if not req.local_path or not os.path.exists(req.local_path):
+            raise HTTPException(400, "Local file not found")
+        return os.path.abspath(req.local_path)
+    if req.source_type == "s3" and req.s3 is not None:
+        objects = s3_source.list_objects(s3_source.get_client(), req.s3.bucket, req.s3.key)
+        if len(objects) != 1 or objects[0].key != req.s3.key:
+            raise HTTPException(400, "This mode needs a single S3 object, not a prefix")
+        INGEST_PROGRESS.set_total(dataset_id, objects[0].size)
+        path = DATASETS.object_path(dataset_id, version, req.file_format.lower())
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as out:
+            def write(obj, buf):
+                out.write(buf)
+            s3_source.fetch_objects(
+                s3_source.get_client(), req.s3.bucket, objects, write,
+                lambda n: INGEST_PROGRESS.update(dataset_id, n, 0),
+                part_size=max(objects[0].size, 1),
+            )
+        os.replace(tmp, path)
+        return path
+    raise HTTPException(400, "Invalid source_type or file_format")
+
+def _register_lazy_parquet(dataset_id: str, req: DatasetRequest) -> Dict[str, Any]:
+    """Lazy registration reads only the parquet footer."""
+    version = DATASETS.next_version(dataset_id)
+    path = _source_file(dataset_id, req, version)
+    rows, columns = parquet_schema(path)
+    return {
+        "rows": rows, "columns": columns, "version": version, "parquet_path": path,
+        "schema": parquet_stream_types(path), "profile": profile_parquet(path),
+    }
+
+def _register_streamed(dataset_id: str, req: DatasetRequest) -> Dict[str, Any]:
+    """
+    Out-of-core registration keeps only the source file. Parquet needs just
+    its footer; a CSV is read once (nothing kept) to settle the column types.
+    """
+    version = DATASETS.next_version(dataset_id)
+    path = _source_file(dataset_id, req, version)
+    if req.file_format.lower() == "parquet":
+        rows, columns = parquet_schema(path)
+        types = parquet_stream_types(path)
+        profile = profile_parquet(path)
+    else:
+        def on_progress(bytes_read, rows_read):
+            INGEST_PROGRESS.update(dataset_id, bytes_read, rows_read)
+        INGEST_PROGRESS.set_total(dataset_id, os.path.getsize(path))
+        arrow_types, rows = scan_csv_types(lambda: open(path, "rb"), on_progress, block_size=CSV_BLOCK_SIZE)
+        columns = list(arrow_types)
+        types = {name: str(dtype) for name, dtype in arrow_types.items()}
+        profile = None
+    return {
+        "rows": rows, "columns": columns, "version": version,
+        "storage": "stream", "source_path": path, "stream_types": types,
+        "schema": types, "profile": profile,
+    }
+
+def _register_dataset(dataset_id: str, req: DatasetRequest, claim: str | None = None):
+    """
+    Registration job: load the source, publish it and mark the entry ready
+    (or failed). claim is the catalog claim of a resumed load, released at the end.
+    """
+    try:
+        _load_and_publish(dataset_id, req)
+    finally:
+        with _LOADING_LOCK:
+            _LOADING.discard(dataset_id)
+        if claim:
+            DATASET_META.release(dataset_id, claim)
+
+def _store_table(dataset_id: str, table: pa.Table) -> Dict[str, Any]:
+    """Optimize, profile and write table as the dataset's next version; returns its catalog fields."""
+    report = None
+    if DTYPE_OPTIMIZE:
+        table, report = optimize_table(table, CATEGORY_MAX_RATIO)
+    date_formats = report["date_formats"] if report else {}
+    profile = profile_table(table, PROFILE_TOP_K, date_formats)
+    version = DATASETS.put(dataset_id, table)
+    return {
+        "rows": table.num_rows,
+        "columns": table.column_names,
+        "version": version,
+        "schema": {f.name: str(f.type) for f in table.schema},
+        "profile": profile,
+        "memory": {"before": report["memory_before"], "after": report["memory_after"]} if report else None,
+        "dtypes": report["dtypes"] if report else None,
+        "date_formats": date_formats,
+    }
+
+def _part_entries(objects, rows: List[int]) -> List[Dict[str, Any]]:
+    """Catalog record of the source files behind a version, used by refresh."""
+    return [{"key": obj.key, "etag": obj.etag, "rows": n} for obj, n in zip(objects, rows)]
+
+def _load_fields(dataset_id: str, req: DatasetRequest, objects) -> Dict[str, Any]:
+    """Load the listed source files in full and publish them as a new version."""
+    if req.stream or (req.lazy and req.file_format.lower() == "parquet"):
+        register = _register_streamed if req.stream else _register_lazy_parquet
+        fields = register(dataset_id, req)
+        fields["parts"] = _part_entries(objects, [fields["rows"]])
+        return fields
+    if _loads_parts(req, objects):
+        INGEST_PROGRESS.set_total(dataset_id, sum(obj.size for obj in objects))
+        tables = _load_s3_objects(req, objects, dataset_id)
+        table, rows = concat_parts(tables), [t.num_rows for t in tables]
+    else:
+        data = load_dataset_from_source(req, dataset_id, objects)
+        table = data if isinstance(data, pa.Table) else to_arrow(data)
+        rows = [table.num_rows]
+    fields = _store_table(dataset_id, table)
+    fields["parts"] = _part_entries(objects, rows)
+    return fields
+
+def _load_and_publish(dataset_id: str, req: DatasetRequest):
+    meta = dict(DATASET_META[dataset_id])
+    try:
+        fields = _load_fields(dataset_id, req, _list_source(req))
+    except Exception as e:
+        error = str(e.detail) if isinstance(e, HTTPException) else f"Failed to load dataset: {e}"
+        INGEST_PROGRESS.finish(dataset_id, error=error)
+        meta.update(status="failed", error=error)
+        DATASET_META[dataset_id] = meta
+        return
+    meta.update(fields, status="ready", error=None)
+    DATASET_META[dataset_id] = meta
+    _invalidate_dataset_caches(dataset_id)
+    if COLUMN_INDEX_EAGER and not DATASETS.is_streamed(dataset_id):
+        _build_dataset_indexes(dataset_id)
+    INGEST_PROGRESS.finish(dataset_id)
+
 @app.post("/api/datasets")
 def add_dataset(req: DatasetRequest):
+    """Registers the dataset as "loading" and returns at once; poll its progress or status."""
     dataset_id = "ds_" + str(uuid.uuid4().int)[:8]
-    df = load_dataset_from_source(req)
-    DATASETS[dataset_id] = df
     DATASET_META[dataset_id] = {
         "id": dataset_id,
         "name": req.name,
         "source_type": req.source_type,
         "file_format": req.file_format,
-        "rows": df.shape[0],
-        "columns": list(df.columns)
+        "status": "loading",
+        "error": None,
+        "rows": None,
+        "columns": [],
+        "version": 0,
+        "source": req.model_dump(),   # lets a restarted worker load it again
     }
+    _submit_registration(dataset_id, req)
     return DATASET_META[dataset_id]
 
+def _submit_registration(dataset_id: str, req: DatasetRequest, claim: str | None = None):
+    with _LOADING_LOCK:
+        _LOADING.add(dataset_id)
+    INGEST_PROGRESS.start(dataset_id)
+    INGEST_POOL.submit(_register_dataset, dataset_id, req, claim)
+
+def _resume_registration(dataset_id: str, meta: Dict[str, Any], claim: str):
+    """Load an interrupted (or lost) dataset again from its source descriptor."""
+    if not meta.get("source"):
+        DATASET_META[dataset_id] = dict(
+            meta, status="failed", error="Load was interrupted; register the dataset again"
+        )
+        DATASET_META.release(dataset_id, claim)
+        return
+    DATASET_META[dataset_id] = dict(meta, status="loading", error=None)
+    _submit_registration(dataset_id, DatasetRequest(**meta["source"]), claim)
+
+def _recover_catalog():
+    """
+    Startup check of the persisted catalog. Ready datasets are attached
+    lazily on first use; the ones whose files are gone (e.g. a cleaned temp
+    dir) are loaded again from their source.
+    """
+    for dataset_id in list(DATASET_META):
+        try:
+            meta = DATASET_META[dataset_id]
+            if meta.get("status", "ready") != "ready" or DATASETS.has_files(dataset_id):
+                continue
+            stamp = DATASET_META.modified_ns(dataset_id)
+        except KeyError:
+            continue
+        claim = f"missing-{stamp}"
+        if DATASET_META.claim(dataset_id, claim, stamp):
+            _resume_registration(dataset_id, meta, claim)
+
+def _catalog_keeper():
+    """Heartbeat for this process's loads; resumes loads and refreshes whose worker died."""
+    while True:
+        with _LOADING_LOCK:
+            mine = set(_LOADING)
+        for dataset_id in mine:
+            DATASET_META.touch(dataset_id)
+        now = time.time_ns()
+        for dataset_id in list(DATASET_META):
+            if dataset_id in mine:
+                continue
+            try:
+                meta = DATASET_META[dataset_id]
+                stamp = DATASET_META.modified_ns(dataset_id)
+            except KeyError:
+                continue
+            if now - stamp < INGEST_STALE_S * 1e9:
+                continue
+            if meta.get("status") == "loading":
+                claim = f"stale-{stamp}"
+                if DATASET_META.claim(dataset_id, claim, stamp):
+                    _resume_registration(dataset_id, meta, claim)
+            elif meta.get("refreshing"):
+                # same key as the refresh endpoint, so only one of them restarts it
+                claim = f"refresh-{stamp}"
+                if DATASET_META.claim(dataset_id, claim, stamp):
+                    _start_refresh(dataset_id, meta, claim)
+        time.sleep(INGEST_HEARTBEAT_S)
+
+def _refresh_plan(meta: Dict[str, Any], objects) -> Dict[str, List[str]]:
+    """Source files added, changed (new ETag/mtime), removed or unchanged since the published version."""
+    old = {p["key"]: p.get("etag") for p in meta.get("parts") or []}
+    new = {obj.key: obj.etag for obj in objects}
+    return {
+        "added": [k for k in new if k not in old],
+        "changed": [k for k in new if k in old and old[k] != new[k]],
+        "removed": [k for k in old if k not in new],
+        "unchanged": [k for k in new if k in old and old[k] == new[k]],
+    }
+
+def _refresh_fields(dataset_id: str, req: DatasetRequest, meta: Dict[str, Any], objects,
+                    unchanged: set) -> Dict[str, Any]:
+    """
+    In-memory datasets loaded part by part fetch only new and changed parts;
+    unchanged parts are sliced out of the published version. Anything else
+    is loaded again in full.
+    """
+    old = meta.get("parts") or []
+    incremental = (
+        _loads_parts(req, objects)
+        and not req.stream and not (req.lazy and req.file_format.lower() == "parquet")
+        and unchanged
+        and sum(p.get("rows") or 0 for p in old) == meta.get("rows")
+        and DATASETS.has_files(dataset_id)
+    )
+    if not incremental:
+        return _load_fields(dataset_id, req, objects)
+    offsets, pos = {}, 0
+    for part in old:
+        offsets[part["key"]] = (pos, part["rows"])
+        pos += part["rows"]
+    current = restore_table(DATASETS.table(dataset_id), meta.get("date_formats"))
+    fetch = [obj for obj in objects if obj.key not in unchanged]
+    INGEST_PROGRESS.set_total(dataset_id, sum(obj.size for obj in fetch))
+    fetched = dict(zip([obj.key for obj in fetch], _load_s3_objects(req, fetch, dataset_id)))
+    tables = [fetched[obj.key] if obj.key in fetched else current.slice(*offsets[obj.key])
+              for obj in objects]
+    fields = _store_table(dataset_id, concat_parts(tables))
+    fields["parts"] = _part_entries(objects, [t.num_rows for t in tables])
+    return fields
+
+def _refresh_dataset(dataset_id: str, req: DatasetRequest, claim: str, objects=None,
+                     plan: Dict[str, List[str]] | None = None):
+    """
+    Refresh job: the dataset keeps serving its current version until the new
+    one is published. Without objects (a refresh resumed after its worker
+    died) the source is listed again. claim is released at the end.
+    """
+    try:
+        meta = dict(DATASET_META[dataset_id])
+        try:
+            if objects is None:
+                objects = _list_source(req)
+                plan = _refresh_plan(meta, objects)
+                if not (plan["added"] or plan["changed"] or plan["removed"]):
+                    meta.update(refreshing=False, refresh_error=None)
+                    DATASET_META[dataset_id] = meta
+                    INGEST_PROGRESS.finish(dataset_id)
+                    return
+            fields = _refresh_fields(dataset_id, req, meta, objects, set(plan["unchanged"]))
+        except Exception as e:
+            error = str(e.detail) if isinstance(e, HTTPException) else f"Failed to refresh dataset: {e}"
+            INGEST_PROGRESS.finish(dataset_id, error=error)
+            meta.update(refreshing=False, refresh_error=error)
+            DATASET_META[dataset_id] = meta
+            return
+        meta.update(
+            fields, refreshing=False, refresh_error=None, refreshed_at=time.time(),
+            last_refresh={k: len(v) for k, v in plan.items()},
+        )
+        DATASET_META[dataset_id] = meta
+        # other workers key their caches by version and drop nothing else
+        _invalidate_dataset_caches(dataset_id)
+        INGEST_PROGRESS.finish(dataset_id)
+    finally:
+        with _LOADING_LOCK:
+            _LOADING.discard(dataset_id)
+        DATASET_META.release(dataset_id, claim)
+
+def _start_refresh(dataset_id: str, meta: Dict[str, Any], claim: str, objects=None,
+                   plan: Dict[str, List[str]] | None = None):
+    """Mark the entry refreshing (kept alive by the heartbeat) and submit the refresh job."""
+    DATASET_META[dataset_id] = dict(meta, refreshing=True, refresh_error=None)
+    with _LOADING_LOCK:
+        _LOADING.add(dataset_id)
+    INGEST_PROGRESS.start(dataset_id)
+    INGEST_POOL.submit(_refresh_dataset, dataset_id, DatasetRequest(**meta["source"]), claim, objects, plan)
+
+@app.post("/api/datasets/{dataset_id}/refresh")
+def refresh_dataset(dataset_id: str):
+    """
+    Compare the source's ETags (S3) or mtime/size (local) with the published
+    version. Unchanged sources return at once; otherwise a refresh job is
+    started and the dataset's version is bumped when it finishes.
+    """
+    _require_ready(dataset_id)
+    meta = DATASET_META[dataset_id]
+    if not meta.get("source"):
+        raise HTTPException(400, "Dataset has no source descriptor; register it again")
+    req = DatasetRequest(**meta["source"])
+    objects = _list_source(req)
+    plan = _refresh_plan(meta, objects)
+    result = {"id": dataset_id, "version": meta.get("version"), "parts": plan}
+    if not (plan["added"] or plan["changed"] or plan["removed"]):
+        return dict(result, changed=False, refreshing=False)
+    stamp = DATASET_META.modified_ns(dataset_id)
+    running = meta.get("refreshing") and time.time_ns() - stamp < INGEST_STALE_S * 1e9
+    claim = f"refresh-{stamp}"
+    if running or not DATASET_META.claim(dataset_id, claim, stamp):
+        raise HTTPException(409, "Dataset is already being refreshed")
+    _start_refresh(dataset_id, meta, claim, objects, plan)
+    return dict(result, changed=True, refreshing=True)
+
+@app.get("/api/datasets/{dataset_id}/progress")
+def dataset_progress(dataset_id: str):
+    if dataset_id not in DATASET_META:
+        raise HTTPException(404, "Dataset not found")
+    meta = DATASET_META[dataset_id]
+    progress = INGEST_PROGRESS.get(dataset_id) or {"id": dataset_id, "percent": None}
+    # the catalog is authoritative (the job may run in another worker)
+    progress.update(status=meta.get("status", "ready"), error=meta.get("error"),
+                    refreshing=bool(meta.get("refreshing")))
+    if progress["status"] == "ready" and not progress["refreshing"]:
+        progress["percent"] = 100.0
+    return progress
+
 @app.get("/api/datasets")
 def list_datasets():
-    return list(DATASET_META.values())
+    # profiles can be large; they are served per dataset below
+    return [{k: v for k, v in meta.items() if k != "profile"} for meta in DATASET_META.values()]
+
+def _require_ready(dataset_id: str):
+    if dataset_id in DATASET_META:
+        meta = DATASET_META[dataset_id]
+        # a dataset being loaded again after a restart keeps its old version
+        if meta.get("status", "ready") == "ready" and dataset_id in DATASETS:
+            return
+        if meta.get("status") == "failed":
+            raise HTTPException(409, f"Dataset failed to load: {meta.get('error')}")
+        raise HTTPException(409, "Dataset is still loading")
+    raise HTTPException(404, "Dataset not found")
 
 @app.post("/api/activate_dataset/{dataset_id}")
 def activate_dataset(dataset_id: str):
     global ACTIVE_DATASET_ID
-    if dataset_id not in DATASETS:
-        raise HTTPException(404, "Dataset not found")
+    _require_ready(dataset_id)
+    if not (DATASETS.is_lazy(dataset_id) or DATASETS.is_streamed(dataset_id)):
+        DATASETS[dataset_id]   # map it back now if it was evicted
     ACTIVE_DATASET_ID = dataset_id
-    df = DATASETS[dataset_id]
-    return {"dataset_id": dataset_id, "columns": list(df.columns)}
+    return {"dataset_id": dataset_id, "columns": DATASETS.columns(dataset_id)}
+
+@app.get("/api/datasets/{dataset_id}/profile")
+def dataset_profile(dataset_id: str):
+    """
+    Per-column nulls, distinct count, min/max and most frequent values.
+    Exact for in-memory datasets; parquet read lazily or streamed only has
+    footer statistics, and a streamed CSV has no column statistics.
+    """
+    _require_ready(dataset_id)
+    profile = DATASET_META[dataset_id].get("profile") or {}
+    return {
+        "id": dataset_id,
+        "rows": DATASET_META[dataset_id].get("rows"),
+        "exact": profile.get("exact", False),
+        "columns": profile.get("columns", {}),
+    }
 
 @app.get("/api/columns")
 def get_columns(dataset_id: str = Query(...)):
-    if dataset_id not in DATASETS:
-        raise HTTPException(404, "Dataset not found")
-    df = DATASETS[dataset_id]
-    return {"columns": list(df.columns)}
-
-# Global storage for per-dataset, per-column aggregation
-ACTIVE_PIVOT_AGG: Dict[str, Dict[str, str]] = {}
-
-@app.post("/api/pivot")
-def generate_pivot(req: PivotRequest):
-    global ACTIVE_DATASET_ID, ACTIVE_PIVOT_AGG
+    _require_ready(dataset_id)
+    return {"columns": DATASETS.columns(dataset_id)}
 
-    if ACTIVE_DATASET_ID not in DATASETS:
+def _resolve_dataset_id(req: PivotRequest) -> str:
+    dataset_id = req.dataset_id or ACTIVE_DATASET_ID
+    if req.dataset_id:
+        _require_ready(dataset_id)
+    elif dataset_id not in DATASETS:
         raise HTTPException(400, "No active dataset selected")
+    return dataset_id
 
-    df = DATASETS[ACTIVE_DATASET_ID].copy()
+def _resolve_user_aggs(req: PivotRequest) -> Dict[str, str]:
+    """One aggfunc per value column, taken from the request only (no server-side state)."""
+    if isinstance(req.aggfunc, dict):
+        return {col: req.aggfunc.get(col) or "sum" for col in req.values}
+    return {col: req.aggfunc or "sum" for col in req.values}
 
-    # 1️⃣ QuickSight-style NULL & EMPTY handling
-    for col in df.columns:
-        df[col] = df[col].apply(
-            lambda x: "__NULL__" if x is None else
-                      "__EMPTY__" if isinstance(x, str) and x.strip() == "" else
-                      x
+def _plan_calculated_fields(dataset_id: str, req: PivotRequest) -> PivotRequest:
+    """
+    The request keeping only the calculated fields its rows, columns, values
+    and filters reach, dependencies first. Cycles and unknown references are
+    rejected here, before any data is read; unused fields are never parsed.
+    """
+    if not req.calculated_fields:
+        return req
+    fields = {f.name: f for f in req.calculated_fields}   # a repeated name: last one wins
+    targets = (req.rows or []) + (req.columns or []) + (req.values or []) + [f.column for f in req.filters]
+    try:
+        order = evaluation_order(
+            {name: f.formula for name, f in fields.items()}, DATASETS.columns(dataset_id), targets
         )
+    except FormulaError as e:
+        raise HTTPException(400, f"Calculated field error: {e}")
+    aggregate = [name for name in order if is_aggregate(fields[name].formula)]
+    grouped = set(req.rows or []) | set(req.columns or []) | {f.column for f in req.filters}
+    misused = [name for name in aggregate if name in grouped]
+    if misused:
+        raise HTTPException(400, f"Aggregate field '{misused[0]}' can only be used as a value")
+    if aggregate and not req.rows:
+        raise HTTPException(400, "Aggregate fields need at least one row dimension")
+    names = set(DATASETS.columns(dataset_id)) | set(fields)
+    for name in aggregate:
+        try:
+            split_aggregate(fields[name].formula, names, lambda agg, formula: "measure")
+        except FormulaError as e:
+            raise HTTPException(400, f"Calculated field error: calculated field {name!r}: {e}")
+    return req.model_copy(update={"calculated_fields": [fields[name] for name in order]})
 
-    # 2️⃣ Apply calculated fields
+def _expand_aggregate_fields(dataset_id: str, req: PivotRequest):
+    """
+    Replace aggregate-level fields by the measures they aggregate: each
+    distinct (aggfunc, row-level formula) becomes a hidden calculated field
+    pivoted as an extra value. Returns the rewritten request, the
+    (field, formula over measures) pairs and the measure columns.
+    """
+    names = set(DATASETS.columns(dataset_id)) | {f.name for f in req.calculated_fields}
+    measures: Dict[tuple, str] = {}   # (aggfunc, row formula) -> measure column
+
+    def measure(agg: str, formula: str) -> str:
+        return measures.setdefault((agg, formula), f"__measure{len(measures)}")
+
+    fields, aggregates = [], []
+    for f in req.calculated_fields:
+        if is_aggregate(f.formula):
+            aggregates.append((f.name, split_aggregate(f.formula, names, measure)))
+        else:
+            fields.append(f)
+    if not aggregates:
+        return req, [], []
+    derived = {name for name, _ in aggregates}
+    user_aggs = _resolve_user_aggs(req)
+    values = [v for v in req.values if v not in derived]
+    aggfunc = {v: user_aggs[v] for v in values}
+    for (agg, formula), column in measures.items():
+        fields.append(CalculatedField(name=column, formula=formula))
+        values.append(column)
+        aggfunc[column] = agg
+    req = req.model_copy(update={"calculated_fields": fields, "values": values, "aggfunc": aggfunc})
+    return req, aggregates, list(measures.values())
+
+def _referenced_columns(req: PivotRequest, stored: List[str]) -> set:
+    """Stored columns a request reads: dimensions, values, filters and formula inputs."""
+    needed = set(req.rows) | set(req.columns) | set(req.values) | {f.column for f in req.filters}
+    names = set(stored) | {f.name for f in req.calculated_fields}
+    for f in req.calculated_fields:
+        try:
+            needed.update(formula_references(f.formula, names))
+        except FormulaError:
+            pass   # reported when the field is evaluated
+    return needed & set(stored)
+
+def _date_operand(value, fmt: str):
+    """A filter operand on a date column, read in the format the source used."""
+    if isinstance(value, list):
+        return [_date_operand(v, fmt) for v in value]
+    if isinstance(value, str):
+        try:
+            return pd.to_datetime(value, format=fmt)
+        except (ValueError, TypeError):
+            return value
+    return value
+
+def _row_filters(dataset_id: str, req: PivotRequest) -> List[RowFilter]:
+    """
+    The request's filters, validated: unknown columns and operators are a
+    400 instead of being skipped. Operands on columns parsed as dates at
+    ingest are read in the column's source format (as the profile prints them).
+    """
+    stored = set(DATASETS.columns(dataset_id))
+    derived = {f.name for f in req.calculated_fields}
+    formats = DATASET_META[dataset_id].get("date_formats") or {}
+    filters = []
+    for item in req.filters:
+        if item.column not in stored and item.column not in derived:
+            raise HTTPException(400, f"Unknown filter column '{item.column}'")
+        fmt = None if item.column in derived else formats.get(item.column)
+        read = (lambda v: _date_operand(v, fmt)) if fmt else (lambda v: v)
+        try:
+            f = make_filter(item.column, item.op, read(item.value), read(list(item.values)),
+                            read(item.min), read(item.max))
+        except FilterError as e:
+            raise HTTPException(400, f"Filter error: {e}")
+        if f is not None:
+            filters.append(f)
+    return filters
+
+def _filter_encoder(dataset_id: str, df: pd.DataFrame, positions):
+    """
+    Dictionary codes for filtering the stored frame: the cached column
+    indexes, except for floats (compared directly) and indexes with merged
+    blanks (their codes are only valid for grouping). None for row subsets
+    (a pruned parquet scan) and streamed datasets.
+    """
+    if positions is not None or DATASETS.is_streamed(dataset_id):
+        return None
+    stored = set(DATASETS.columns(dataset_id))
+
+    def encoded(col: str):
+        if col not in stored or df[col].dtype.kind == "f":
+            return None
+        index = _column_index(dataset_id, col)
+        if index is None or index.blanks_merged:
+            return None
+        return index.codes, index.uniques
+    return encoded
+
+def _filter_rows(df: pd.DataFrame, filters: List[RowFilter], positions,
+                 encoded=None, columns: set | None = None):
+    """
+    One selection for every filter (AND), then the surviving rows are taken
+    once, for the given columns only (all when None); positions follow them.
+    """
+    try:
+        keep = select_rows(filters, lambda col: df[col], encoded or (lambda col: None))
+    except FilterError as e:
+        raise HTTPException(400, f"Filter error: {e}")
+    if keep is None:
+        return df, positions
+    rows = np.flatnonzero(keep)
+    names = [c for c in df.columns if columns is None or c in columns]
+    df = pd.DataFrame(
+        {c: df[c].array.take(rows) for c in names}, index=df.index.take(rows), copy=False
+    )
+    return df, (rows if positions is None else positions[rows])
+
+def _apply_calculated_and_filters(df: pd.DataFrame, req: PivotRequest, filters: List[RowFilter],
+                                  positions, dataset: tuple | None = None):
+    """
+    Steps 1-2 of the pipeline, also used per batch by streamed pivots.
+    Filters on stored columns run first, so formulas are only evaluated on
+    the rows that survive them; filters on calculated fields run last.
+    dataset is (dataset_id, version) when df comes from the stored frame.
+    """
+    derived = {f.name for f in req.calculated_fields}
+    early = [f for f in filters if f.column not in derived]
+    late = [f for f in filters if f.column in derived]
+
+    # 1️⃣ Filters that do not need a calculated field. Columns only they
+    # read are not carried over to the filtered frame.
+    used = set(req.rows) | set(req.columns) | set(req.values) | {f.column for f in late}
+    names = set(df.columns) | derived
+    for field in req.calculated_fields:
+        try:
+            used.update(formula_references(field.formula, names))
+        except FormulaError:
+            pass   # reported when the field is evaluated
+    encoded = _filter_encoder(dataset[0], df, positions) if dataset is not None else None
+    df, positions = _filter_rows(df, early, positions, encoded, used)
+
+    # 2️⃣ Calculated fields on the surviving rows, then the filters that need them
     if req.calculated_fields:
         try:
-            df = apply_calculated_fields(df, req.calculated_fields)
+            df = apply_calculated_fields(df.copy(deep=False), req.calculated_fields, dataset, positions)
         except Exception as e:
             raise HTTPException(400, f"Calculated field error: {e}")
+    df, positions = _filter_rows(df, late, positions)
+    return df, positions
 
-    # ✅ 3️⃣ APPLY FILTERS (FIXED)
-    if getattr(req, "filters", None):
-        for f in req.filters:
-            try:
-                if f.column in df.columns:
-                    df = df[df[f.column] == f.value]
-            except Exception:
-                continue
-
-    # 4️⃣ Merge per-column aggregation state
-    if ACTIVE_DATASET_ID not in ACTIVE_PIVOT_AGG:
-        ACTIVE_PIVOT_AGG[ACTIVE_DATASET_ID] = {}
-
-    # Update stored aggfuncs with user input
-    if isinstance(req.aggfunc, dict):
-        ACTIVE_PIVOT_AGG[ACTIVE_DATASET_ID].update(req.aggfunc)
+def _prepare_pivot_frame(dataset_id: str, req: PivotRequest, user_aggs: Dict[str, str]):
+    """
+    Steps shared by every engine: calculated fields, filters and the agg dict.
+    Also returns the positions of the surviving rows in the stored frame
+    (None when nothing was filtered) so cached column indexes can be sliced,
+    and the row-group counts when a parquet scan was pruned (else None).
+    """
+    # Stored frame is never mutated, so no up-front copy is needed
+    stored = DATASETS.columns(dataset_id)
+    needed = _referenced_columns(req, stored)
+    derived = {f.name for f in req.calculated_fields}
+    filters = _row_filters(dataset_id, req)
+    predicates = [f for f in filters
+                  if f.column in stored and f.column not in derived and f.op in PRUNABLE_OPS]
+    scan = None
+    if predicates and DATASETS.is_lazy(dataset_id):
+        # parquet: skip row groups whose statistics rule the filters out
+        df, positions, scan = DATASETS.scan(dataset_id, needed, predicates)
     else:
-        for col in req.values:
-            if col not in ACTIVE_PIVOT_AGG[ACTIVE_DATASET_ID]:
-                ACTIVE_PIVOT_AGG[ACTIVE_DATASET_ID][col] = req.aggfunc
+        df = DATASETS.frame(dataset_id, needed)
+        positions = None
+
+    df, positions = _apply_calculated_and_filters(
+        df, req, filters, positions, (dataset_id, DATASETS.version(dataset_id))
+    )
 
-    # Build agg dict for pandas pivot
+    # 3️⃣ Build agg dict for pandas pivot
     agg_dict = {}
     for col in req.values:
-        user_agg = ACTIVE_PIVOT_AGG[ACTIVE_DATASET_ID].get(col, "sum")
-        agg_dict[col] = _get_pandas_aggfunc(df, col, user_agg)
+        agg_dict[col] = _get_pandas_aggfunc(df, col, user_aggs[col])
 
-    # 5️⃣ Generate pivot table
+    return df, agg_dict, positions, scan
+
+# -----------------------------
+# Pivot execution (process pool with bounded queue)
+# -----------------------------
+# 0 workers runs pivots on a single background thread instead of processes
+PIVOT_POOL_WORKERS = int(os.getenv("PIVOT_POOL_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+PIVOT_POOL_QUEUE = int(os.getenv("PIVOT_POOL_QUEUE", 16))
+PIVOT_POOL_START_METHOD = os.getenv("PIVOT_POOL_START_METHOD", "spawn")
+
+# Out-of-core pivots: rows per record batch and partial groups kept before re-merging
+STREAM_BATCH_ROWS = int(os.getenv("STREAM_BATCH_ROWS", 1_000_000))
+STREAM_COMPACT_ROWS = int(os.getenv("STREAM_COMPACT_ROWS", 1_000_000))
+
+PIVOT_POOL = BoundedProcessPool(PIVOT_POOL_WORKERS, PIVOT_POOL_QUEUE, PIVOT_POOL_START_METHOD)
+
+def _streamed_pivot(dataset_id: str, req: PivotRequest, user_aggs: Dict[str, str]):
+    """
+    Out-of-core steps 1-4: each record batch gets calculated fields and
+    filters, then is folded into per-group partial aggregates; the pivot is
+    built from one row per group. Returns (pivot, total row, row-group counts).
+    """
+    stored = DATASETS.columns(dataset_id)
+    derived = {f.name for f in req.calculated_fields}
+    filters = _row_filters(dataset_id, req)
+    predicates = [f for f in filters
+                  if f.column in stored and f.column not in derived and f.op in PRUNABLE_OPS]
+    batches, scan = DATASETS.iter_batches(
+        dataset_id, _referenced_columns(req, stored), predicates, STREAM_BATCH_ROWS
+    )
+    dims = (req.rows or []) + (req.columns or [])
+    agg = None
+    for batch in batches:
+        df, _ = _apply_calculated_and_filters(batch, req, filters, None)
+        if agg is None:
+            kernels = {}
+            for col in req.values:
+                kernel = _get_pandas_aggfunc(df, col, user_aggs[col])
+                kernels[col] = kernel if isinstance(kernel, str) else "nunique"
+            try:
+                agg = StreamingAggregator(dims, kernels, STREAM_COMPACT_ROWS)
+            except UnsupportedPivot as e:
+                raise HTTPException(400, f"Not supported for streamed datasets: {e}")
+        agg.add(_normalize_dimensions(df, dims))
+    if agg is None:
+        raise HTTPException(400, "Dataset has no rows to pivot")
+    groups, agg_dict = agg.result()
     try:
-        pivot = pd.pivot_table(
-            df,
-            index=req.rows or None,
-            columns=req.columns or None,
-            values=req.values,
-            aggfunc=agg_dict,
-            fill_value=0,
-            dropna=False
-        )
+        pivot, engine = _run_pivot_engine(groups, req, agg_dict, PIVOT_ENGINE)
+        total = None
+        if req.rows:
+            # the partials merged per column key give exact totals (means included)
+            totals, total_aggs = agg.result(req.columns or [])
+            total = _total_pivot(totals, req, total_aggs, pivot, engine)
     except Exception as e:
         raise HTTPException(400, f"Pivot error: {e}")
+    return pivot, total, scan
+
+def _compute_pivot(dataset_id: str, req: PivotRequest):
+    """Full pivot pipeline for one request; returns (records, estimated bytes, scan counts)."""
+    # aggregate-level fields are pivoted as their measures, evaluated after grouping
+    req, aggregates, measures = _expand_aggregate_fields(dataset_id, req)
+    user_aggs = _resolve_user_aggs(req)
+    if DATASETS.is_streamed(dataset_id):
+        pivot, total, scan = _streamed_pivot(dataset_id, req, user_aggs)
+    else:
+        df, agg_dict, positions, scan = _prepare_pivot_frame(dataset_id, req, user_aggs)
+        encode = _pivot_encoder(
+            dataset_id, df, positions, {f.name for f in req.calculated_fields}
+        )
+
+        # 4️⃣ Generate pivot table (and its grand total with the same aggfuncs)
+        try:
+            pivot, engine = _run_pivot_engine(df, req, agg_dict, PIVOT_ENGINE, encode)
+            total = _total_pivot(df, req, agg_dict, pivot, engine, encode)
+        except Exception as e:
+            raise HTTPException(400, f"Pivot error: {e}")
+
+    if aggregates:
+        pivot = _apply_aggregate_fields(pivot, aggregates, measures, bool(req.columns))
+        if total is not None:
+            total = _apply_aggregate_fields(total, aggregates, measures, bool(req.columns))
 
-    # 6️⃣ Reset index
+    # 5️⃣ Reset index (column keys are labelled first, see _label_column_keys)
+    date_formats = DATASET_META[dataset_id].get("date_formats")
+    pivot = _label_column_keys(pivot, bool(req.columns), date_formats)
     pivot = pivot.reset_index()
 
+    # 6️⃣ Restore QuickSight-friendly labels on the grouped keys
+    pivot = _label_dimension_keys(pivot, req.rows or [], date_formats)
+
     # 7️⃣ Add QuickSight-style TOTAL row
     total_row = {}
-    if req.rows:
-        for col in req.rows:
-            total_row[col] = "Total"
-
-    for col in pivot.columns:
-        if col not in (req.rows or []):
+    if total is not None:
+        # value columns line up with the total by position (keys were relabelled)
+        n_rows = len(req.rows)
+        for i, col in enumerate(pivot.columns):
+            total_row[col] = "Total" if i < n_rows else total.iat[0, i - n_rows]
+    else:
+        for col in pivot.columns:
             try:
                 total_row[col] = pivot[col].sum()
             except:
@@ -357,13 +1430,301 @@ def generate_pivot(req: PivotRequest):
 
     pivot = pd.concat([pivot, pd.DataFrame([total_row])], ignore_index=True)
 
-    # 8️⃣ Restore QuickSight-friendly labels
-    pivot = pivot.replace({
-        "__NULL__": "null",
-        "__EMPTY__": "empty"
-    })
+    return pivot.to_dict(orient="records"), int(pivot.memory_usage(deep=True).sum()), scan
+
+# -----------------------------
+# Single-flight coalescing of identical in-flight pivots
+# -----------------------------
+# How long followers wait on an identical computation (from when it started)
+PIVOT_COALESCE_TIMEOUT = float(os.getenv("PIVOT_COALESCE_TIMEOUT", 120))
+
+class SingleFlight:
+    """
+    Per-process request coalescing: while a computation for a key is running,
+    later callers with the same key await its result instead of starting
+    another one. Followers give up once the key's deadline passes.
+    """
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self._calls: Dict[tuple, tuple] = {}   # key -> (task, deadline)
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    async def do(self, key: tuple, fn: Callable[[], Awaitable[Any]]):
+        call = self._calls.get(key)
+        if call is not None:
+            task, deadline = call
+            self.coalesced += 1
+            try:
+                return await asyncio.wait_for(asyncio.shield(task), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise
+
+        # the computation is a task of its own: a cancelled leader (client
+        # gone) stops waiting for it, but followers still get its result
+        task = asyncio.ensure_future(fn())
+        self._calls[key] = (task, time.monotonic() + self.timeout)
+        self.leaders += 1
+        task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: tuple, task: asyncio.Future):
+        if self._calls.get(key, (None,))[0] is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()   # mark retrieved when nobody was waiting
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._calls),
+            "timeout_s": self.timeout,
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts,
+        }
+
+PIVOT_FLIGHTS = SingleFlight(PIVOT_COALESCE_TIMEOUT)
+
+def _process_stats() -> Dict[str, Any]:
+    """Snapshot of this process's attached datasets and in-process caches."""
+    return {
+        "pid": os.getpid(),
+        "reported_at": round(time.time(), 3),
+        "datasets": DATASETS.memory_stats(),
+        "lazy_columns": DATASETS.lazy_columns.stats(),
+        "column_indexes": COLUMN_INDEXES.stats(),
+        "formula_plans": FORMULA_PLANS.stats(),
+        "calculated_columns": DERIVED_COLUMNS.stats(),
+    }
+
+# Latest snapshot of each pool worker process by pid, as of its last job
+# (pivots attach frames, build indexes and cache formulas in the workers)
+WORKER_STATS: Dict[int, Dict[str, Any]] = {}
+
+def _record_worker_stats(snapshot: Dict[str, Any] | None):
+    if snapshot and snapshot["pid"] != os.getpid():   # thread mode runs jobs in this process
+        WORKER_STATS[snapshot["pid"]] = snapshot
+
+def _summed(snapshots: List[Dict[str, Any]], section: str, keys) -> Dict[str, Any]:
+    """Counters of one stats section added up over processes."""
+    return {k: round(sum(snap[section][k] for snap in snapshots), 3) for k in keys}
+
+def _pivot_task(dataset_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Pool entry point. HTTPException does not pickle, so errors travel as
+    data; any other failure is reported as a 400 "Pivot error" like the
+    pipeline's own. Every result carries the worker's stats snapshot.
+    """
+    started = time.time()
+    try:
+        records, nbytes, scan = _compute_pivot(dataset_id, PivotRequest(**payload))
+    except HTTPException as e:
+        return {"started": started, "status": e.status_code, "detail": e.detail,
+                "stats": _process_stats()}
+    except Exception as e:
+        return {"started": started, "status": 400, "detail": f"Pivot error: {type(e).__name__}: {e}",
+                "stats": _process_stats()}
+    return {"started": started, "records": records, "nbytes": nbytes, "scan": scan,
+            "stats": _process_stats()}
+
+def _set_scan_headers(response: Response, scan: Dict[str, int] | None):
+    """Row-group pruning counts; the body stays a plain list of records."""
+    if scan:
+        response.headers["X-Pivot-Row-Groups"] = str(scan["row_groups"])
+        response.headers["X-Pivot-Row-Groups-Scanned"] = str(scan["scanned"])
+        response.headers["X-Pivot-Row-Groups-Pruned"] = str(scan["pruned"])
+
+def _estimate_pivot(dataset_id: str, req: PivotRequest):
+    """Output size from the dataset profile, or None when it cannot tell."""
+    profile = DATASET_META[dataset_id].get("profile")
+    if not profile:
+        return None
+    derived = {f.name for f in req.calculated_fields}
+    filters = [(f.column, f.value) for f in req.filters
+               if f.op == "eq" and f.value is not None and not isinstance(f.value, list)
+               and f.column not in derived]
+    return estimate_pivot_size(profile, req.rows or [], req.columns or [], len(req.values), filters)
+
+@app.post("/api/pivot")
+async def generate_pivot(req: PivotRequest, response: Response):
+    dataset_id = _resolve_dataset_id(req)
+    user_aggs = _resolve_user_aggs(req)
+    req = _plan_calculated_fields(dataset_id, req)
+    _row_filters(dataset_id, req)   # reject bad filters before queueing
+
+    estimate = _estimate_pivot(dataset_id, req)
+    if estimate is not None:
+        response.headers["X-Pivot-Estimated-Rows"] = str(estimate["rows"])
+        response.headers["X-Pivot-Estimated-Cells"] = str(estimate["cells"])
+
+    # Serve repeated requests (re-clicks, header renames) from the result cache
+    cache_key = _pivot_cache_key(dataset_id, req, user_aggs)
+    cached = PIVOT_CACHE.get(cache_key)
+    if cached is not None:
+        records, scan = cached
+        _set_scan_headers(response, scan)
+        return records
+
+    if PIVOT_MAX_CELLS and estimate is not None and estimate["cells"] > PIVOT_MAX_CELLS:
+        raise HTTPException(
+            413, f"Pivot would produce about {estimate['cells']} cells "
+                 f"(limit {PIVOT_MAX_CELLS}); add filters or fewer dimensions"
+        )
+
+    async def compute():
+        try:
+            result = await PIVOT_POOL.run(_pivot_task, dataset_id, req.model_dump())
+        except PoolSaturated as e:
+            raise HTTPException(429, "Too many pivot requests in progress, please retry",
+                                headers={"Retry-After": str(e.retry_after)})
+        except PoolUnavailable as e:
+            WORKER_STATS.clear()   # the pool restarts with new processes
+            raise HTTPException(503, str(e), headers={"Retry-After": "1"})
+        _record_worker_stats(result.get("stats"))
+        if "status" in result:
+            raise HTTPException(result["status"], result["detail"])
+        PIVOT_CACHE.put(cache_key, (result["records"], result["scan"]), result["nbytes"])
+        return result["records"], result["scan"]
+
+    # Identical requests already running (shared dashboards, several users)
+    # wait for that result instead of computing it again
+    try:
+        records, scan = await PIVOT_FLIGHTS.do(cache_key, compute)
+    except asyncio.TimeoutError:
+        raise HTTPException(504, "Timed out waiting for an identical pivot in progress")
+    _set_scan_headers(response, scan)
+    return records
+
+@app.get("/api/pivot/coalescing")
+def pivot_coalescing_stats():
+    return PIVOT_FLIGHTS.stats()
+
+@app.get("/api/pivot/pool")
+def pivot_pool_stats():
+    """Queue depth, admission and wait/run times of the pivot execution pool."""
+    return PIVOT_POOL.stats()
 
-    return pivot.to_dict(orient="records")
+@app.get("/api/pivot/cache")
+def pivot_cache_stats():
+    return PIVOT_CACHE.stats()
+
+@app.get("/api/formulas/cache")
+def formula_cache_stats():
+    """
+    Compiled calculated-field plans and cached evaluated columns. Every
+    process keeps its own: "plans"/"columns" are the API process, "workers"
+    the pool workers as of their last job and "total" adds them all up.
+    """
+    workers = list(WORKER_STATS.values())
+    processes = [_process_stats(), *workers]
+    return {
+        "plans": FORMULA_PLANS.stats(),
+        "columns": DERIVED_COLUMNS.stats(),
+        "workers": [
+            {"pid": w["pid"], "reported_at": w["reported_at"],
+             "plans": w["formula_plans"], "columns": w["calculated_columns"]}
+            for w in workers
+        ],
+        "total": {
+            "plans": _summed(processes, "formula_plans", ("entries", "hits", "misses")),
+            "columns": _summed(processes, "calculated_columns", (
+                "entries", "bytes", "hits", "misses", "evictions", "seconds_saved", "seconds_spent",
+            )),
+        },
+    }
+
+@app.get("/api/store")
+def dataset_store_stats():
+    """Datasets in the shared catalog and those attached by this worker."""
+    return {
+        "root": DATASET_STORE_DIR,
+        "pid": os.getpid(),
+        "catalog": list(DATASET_META),
+        "attached": DATASETS.resident(),
+        "lazy_columns": DATASETS.lazy_columns.stats(),
+    }
+
+@app.get("/api/admin/memory")
+def memory_stats():
+    """
+    Dataset memory per process: attached frames under the budget, lazy
+    columns, indexes and calculated columns. The top level is the API
+    process (which also holds the pivot results), "workers" the pool
+    workers as of their last job; "total_bytes" adds up every process.
+    """
+    workers = list(WORKER_STATS.values())
+    total = PIVOT_CACHE.stats()["bytes"]
+    for snap in [_process_stats(), *workers]:
+        total += (snap["datasets"]["resident_bytes"] + snap["lazy_columns"]["bytes"]
+                  + snap["column_indexes"]["bytes"] + snap["calculated_columns"]["bytes"])
+    return {
+        "pid": os.getpid(),
+        "datasets": DATASETS.memory_stats(),
+        "lazy_columns": DATASETS.lazy_columns.stats(),
+        "column_indexes": COLUMN_INDEXES.stats(),
+        "calculated_columns": DERIVED_COLUMNS.stats(),
+        "pivot_cache": PIVOT_CACHE.stats(),
+        "workers": workers,
+        "total_bytes": total,
+    }
+
+@app.get("/api/indexes")
+def column_index_stats():
+    """
+    Memory held by cached per-column dictionary encodings: the API process,
+    each pool worker as of its last job ("workers") and all of them ("total").
+    """
+    workers = list(WORKER_STATS.values())
+    processes = [_process_stats(), *workers]
+    return {
+        **COLUMN_INDEXES.stats(),
+        "workers": {w["pid"]: w["column_indexes"] for w in workers},
+        "total": _summed(processes, "column_indexes", ("bytes", "builds", "hits", "evictions")),
+    }
+
+@app.post("/api/pivot/compare")
+def compare_pivot_engines(req: PivotRequest):
+    """
+    Run both engines on the same prepared frame (no result cache) and report
+    whether they agree and how long each took.
+    """
+    dataset_id = _resolve_dataset_id(req)
+    req = _plan_calculated_fields(dataset_id, req)
+    req, _, _ = _expand_aggregate_fields(dataset_id, req)   # engines are compared on the measures
+    df, agg_dict, positions, scan = _prepare_pivot_frame(dataset_id, req, _resolve_user_aggs(req))
+    encode = _pivot_encoder(
+        dataset_id, df, positions, {f.name for f in req.calculated_fields}
+    )
+    results, timings = {}, {}
+    for engine in ("pandas", "bincount"):
+        start = time.perf_counter()
+        try:
+            results[engine] = _run_pivot_engine(df, req, agg_dict, engine, encode)
+        except Exception as e:
+            raise HTTPException(400, f"Pivot error ({engine}): {e}")
+        timings[engine] = round((time.perf_counter() - start) * 1000, 3)
+
+    expected, _ = results["pandas"]
+    got, used = results["bincount"]
+    try:
+        pd.testing.assert_frame_equal(
+            got, expected, check_dtype=False, check_index_type=False, check_column_type=False
+        )
+        match, diff = True, None
+    except AssertionError as e:
+        match, diff = False, str(e)
+
+    return {
+        "match": match,
+        "diff": diff,
+        "bincount_engine_used": used,
+        "rows": int(expected.shape[0]),
+        "timings_ms": timings,
+        "scan": scan,
+    }
 
 
 # ---------- Publish report endpoint ----------
@@ -0,0 +1,123 @@
+# compute_pool.py
+# Bounded execution layer for CPU-heavy request work (pivots, calculated fields).
+#
+# Jobs run in a process pool so pandas work does not hold the API process's
+# GIL; at most `workers + max_queue` jobs are admitted at once and the rest
+# are rejected straight away with a retry hint instead of piling up.
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict
+
+
+class PoolSaturated(Exception):
+    """Raised when the queue is full; retry_after is a hint in seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"compute queue full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class PoolUnavailable(Exception):
+    """Raised when the worker pool died while running a job."""
+
+
+class BoundedProcessPool:
+    """
+    workers=0 runs jobs on a dedicated thread pool of one thread instead of
+    processes (handy for development); admission control works the same.
+    Submitted callables must be picklable top-level functions and should
+    return a dict; a numeric "started" key (time.time() when the job began)
+    is used to measure queue wait.
+    """
+
+    def __init__(self, workers: int, max_queue: int, start_method: str = "spawn"):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.start_method = start_method
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+
+    @property
+    def capacity(self) -> int:
+        return max(self.workers, 1) + self.max_queue
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.workers > 0:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context(self.start_method),
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=1)
+            return self._executor
+
+    def _retry_after(self) -> int:
+        avg = self._run_total / self.completed if self.completed else 1.0
+        backlog = self._in_flight / max(self.workers, 1)
+        return max(1, int(round(avg * backlog)))
+
+    async def run(self, fn: Callable[..., Dict[str, Any]], *args) -> Dict[str, Any]:
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self.rejected += 1
+                raise PoolSaturated(self._retry_after())
+            self._in_flight += 1
+            self.submitted += 1
+        submitted_at = time.time()
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._get_executor(), fn, *args)
+        except BrokenProcessPool:
+            with self._lock:
+                self.failed += 1
+                self._executor = None
+            raise PoolUnavailable("compute pool restarted, please retry")
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+        finished_at = time.time()
+        started_at = result.get("started", submitted_at) if isinstance(result, dict) else submitted_at
+        with self._lock:
+            self.completed += 1
+            wait = max(0.0, started_at - submitted_at)
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            self._run_total += max(0.0, finished_at - started_at)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            running = min(self._in_flight, max(self.workers, 1))
+            done = self.completed or 1
+            return {
+                "mode": "process" if self.workers > 0 else "thread",
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "running": running,
+                "queued": self._in_flight - running,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self._wait_total / done * 1000, 3),
+                "max_wait_ms": round(self._wait_max * 1000, 3),
+                "avg_run_ms": round(self._run_total / done * 1000, 3),
+            }
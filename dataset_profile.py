@@ -0,0 +1,160 @@
+# dataset_profile.py
+# Per-column statistics computed once when a dataset is registered: null
+# count, distinct count, min/max and the most frequent values. They are kept
+# in the catalog entry, fill the filter value dropdowns without touching the
+# data and give the pivot endpoint a size estimate before any work is done.
+import datetime
+import decimal
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+PROFILE_TOP_K = 20
+
+
+def _json_value(v: Any, date_format: Optional[str] = None) -> Any:
+    if isinstance(v, float) and not math.isfinite(v):
+        return None
+    if isinstance(v, decimal.Decimal):
+        return float(v)
+    if isinstance(v, datetime.datetime) and date_format:
+        # parsed at ingest: report the value the way the source wrote it
+        return v.strftime(date_format)
+    if isinstance(v, (datetime.date, datetime.time)):
+        return v.isoformat()
+    if isinstance(v, bytes):
+        return v.decode("utf-8", "replace")
+    if hasattr(v, "isoformat"):   # pandas Timestamp, numpy datetime64 via pyarrow
+        return v.isoformat()
+    return v
+
+
+def _profile_column(col: pa.ChunkedArray, top_k: int, date_format: Optional[str]) -> Dict[str, Any]:
+    counts = pc.value_counts(col)
+    values, freq = counts.field("values"), counts.field("counts")
+    valid = pc.is_valid(values)
+    values, freq = values.filter(valid), freq.filter(valid)
+    if pa.types.is_dictionary(values.type):
+        values = values.dictionary_decode()
+    bounds = pc.min_max(values).as_py() if len(values) else {"min": None, "max": None}
+    top = pc.array_sort_indices(freq, order="descending")[:top_k]
+    top_values = values.take(top).to_pylist()
+    top_counts = freq.take(top).to_pylist()
+    # ties are broken by value so the list is stable across runs
+    ranked = sorted(zip(top_counts, top_values), key=lambda t: (-t[0], str(t[1])))
+    return {
+        "nulls": col.null_count,
+        "distinct": len(values),
+        "min": _json_value(bounds["min"], date_format),
+        "max": _json_value(bounds["max"], date_format),
+        "top": [{"value": _json_value(v, date_format), "count": c} for c, v in ranked],
+    }
+
+
+def profile_table(table: pa.Table, top_k: int = PROFILE_TOP_K,
+                  date_formats: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Exact statistics for every column of an in-memory table."""
+    date_formats = date_formats or {}
+    return {
+        "rows": table.num_rows,
+        "exact": True,
+        "columns": {
+            name: _profile_column(col, top_k, date_formats.get(name))
+            for name, col in zip(table.column_names, table.columns)
+        },
+    }
+
+
+def profile_parquet(path: str) -> Dict[str, Any]:
+    """
+    Statistics from the parquet footer only (nothing is read): nulls and
+    min/max per column, merged over row groups. Distinct counts and frequent
+    values are unknown (None) unless the writer recorded them.
+    """
+    pf = pq.ParquetFile(path)
+    md = pf.metadata
+    columns: Dict[str, Dict[str, Any]] = {}
+    for i in range(md.num_columns):
+        name = md.schema.column(i).path
+        if name.startswith("__index_level_"):
+            continue
+        entry = {"nulls": 0, "distinct": None, "min": None, "max": None, "top": None}
+        for rg in range(md.num_row_groups):
+            stats = md.row_group(rg).column(i).statistics
+            if stats is None:
+                entry["nulls"] = None
+                entry["min"] = entry["max"] = None
+                break
+            if entry["nulls"] is not None:
+                entry["nulls"] = entry["nulls"] + stats.null_count if stats.has_null_count else None
+            if not stats.has_min_max:
+                continue
+            lo, hi = stats.min, stats.max
+            entry["min"] = lo if entry["min"] is None else min(entry["min"], lo)
+            entry["max"] = hi if entry["max"] is None else max(entry["max"], hi)
+            if md.num_row_groups == 1 and stats.distinct_count:
+                entry["distinct"] = stats.distinct_count
+        entry["min"], entry["max"] = _json_value(entry["min"]), _json_value(entry["max"])
+        columns[name] = entry
+    return {"rows": md.num_rows, "exact": False, "columns": columns}
+
+
+def _selectivity(stats: Dict[str, Any], rows: int, value: Any) -> float:
+    """Estimated fraction of rows equal to value."""
+    if not rows:
+        return 0.0
+    top = stats.get("top")
+    if top:
+        for item in top:
+            if item["value"] == value:
+                return item["count"] / rows
+        if stats.get("distinct") is not None and len(top) >= stats["distinct"]:
+            return 0.0   # every value is listed
+        if stats.get("distinct"):
+            rest = rows - (stats.get("nulls") or 0) - sum(item["count"] for item in top)
+            return max(rest, 0) / rows / max(stats["distinct"] - len(top), 1)
+    if stats.get("distinct"):
+        return 1.0 / stats["distinct"]
+    return 1.0
+
+
+def estimate_pivot_size(profile: Dict[str, Any], rows: List[str], columns: List[str],
+                        n_values: int, filters: List[Tuple[str, Any]]) -> Optional[Dict[str, int]]:
+    """
+    Upper-bound estimate of the pivot output: (input rows after equality
+    filters, output rows, output cells). None when a dimension has no
+    distinct count (calculated fields, footer-only profiles).
+    """
+    stats = profile.get("columns") or {}
+    n = profile.get("rows") or 0
+    matched = float(n)
+    filtered = {column for column, _ in filters}
+    for column, value in filters:
+        if column in stats:
+            matched *= _selectivity(stats[column], n, value)
+
+    def groups(dims: List[str]) -> Optional[float]:
+        total = 1.0
+        for d in dims:
+            if d in filtered:
+                continue   # pinned to one value
+            s = stats.get(d)
+            if s is None or s.get("distinct") is None:
+                return None
+            total *= s["distinct"] + (1 if s.get("nulls") else 0)
+        return total
+
+    row_groups, col_groups = groups(rows), groups(columns)
+    if row_groups is None or col_groups is None:
+        return None
+    matched = math.ceil(matched)
+    out_rows = min(row_groups, matched)
+    out_cols = min(col_groups, matched) * max(n_values, 1)
+    return {
+        "input_rows": int(matched),
+        "rows": int(out_rows),
+        "cells": int(out_rows * out_cols),
+    }
@@ -0,0 +1,634 @@
+# dataset_store.py
+# Dataset storage shared by every uvicorn worker on a host.
+#
+# Each dataset version is written once as an uncompressed Arrow IPC file and
+# every worker memory-maps it, so numeric columns are zero-copy views on the
+# shared page cache and string columns stay Arrow-backed (string[pyarrow]).
+# A small catalog (one JSON file per dataset) records which datasets are
+# resident, their metadata and current version.
+#
+# Parquet datasets can instead be registered lazily: only the schema and row
+# count are read up front and each column is read from the file the first
+# time it is asked for, then kept in a per-process LRU under a byte budget.
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping, MutableMapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from filter_engine import RowFilter, row_group_may_match
+from lru_cache import LRUCache
+from ingest import iter_csv_batches
+
+_STRING_TYPES = {
+    pa.string(): pd.StringDtype("pyarrow"),
+    pa.large_string(): pd.StringDtype("pyarrow"),
+}
+
+
+def _atomic_write(path: str, data: bytes):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+class DatasetCatalog(MutableMapping):
+    """
+    dataset_id -> metadata dict, persisted as <root>/<dataset_id>.json.
+    Reads are cached per process and refreshed when the file changes, so a
+    dataset registered by one worker is visible to all of them.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._cache: Dict[str, Tuple[Tuple[int, int], Dict[str, Any], int]] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, dataset_id: str) -> str:
+        return os.path.join(self.root, f"{dataset_id}.json")
+
+    def _load(self, dataset_id: str):
+        path = self._path(dataset_id)
+        try:
+            st = os.stat(path)
+        except (FileNotFoundError, OSError):
+            with self._lock:
+                self._cache.pop(dataset_id, None)
+            return None
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            hit = self._cache.get(dataset_id)
+            if hit is not None and hit[0] == stamp:
+                return hit
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
+                entry = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        hit = (stamp, entry["meta"], entry.get("registered_ns", 0))
+        with self._lock:
+            self._cache[dataset_id] = hit
+        return hit
+
+    def __getitem__(self, dataset_id: str) -> Dict[str, Any]:
+        hit = self._load(dataset_id)
+        if hit is None:
+            raise KeyError(dataset_id)
+        return hit[1]
+
+    def __setitem__(self, dataset_id: str, meta: Dict[str, Any]):
+        old = self._load(dataset_id)
+        entry = {
+            "registered_ns": old[2] if old is not None else time.time_ns(),
+            "meta": meta,
+        }
+        _atomic_write(self._path(dataset_id), json.dumps(entry, default=str).encode("utf-8"))
+
+    def __delitem__(self, dataset_id: str):
+        try:
+            os.remove(self._path(dataset_id))
+        except FileNotFoundError:
+            raise KeyError(dataset_id)
+        with self._lock:
+            self._cache.pop(dataset_id, None)
+        for name in os.listdir(self.root):
+            if name.startswith(f"{dataset_id}.") and name.endswith(".claim"):
+                try:
+                    os.remove(os.path.join(self.root, name))
+                except OSError:
+                    pass
+
+    def touch(self, dataset_id: str):
+        """Bump the entry's modification time (heartbeat of a running load)."""
+        try:
+            os.utime(self._path(dataset_id))
+        except FileNotFoundError:
+            pass
+
+    def modified_ns(self, dataset_id: str) -> int:
+        try:
+            return os.stat(self._path(dataset_id)).st_mtime_ns
+        except FileNotFoundError:
+            raise KeyError(dataset_id)
+
+    def _claim_path(self, dataset_id: str, key: str) -> str:
+        return os.path.join(self.root, f"{dataset_id}.{key}.claim")
+
+    def claim(self, dataset_id: str, key: str, modified_ns: Optional[int] = None) -> bool:
+        """
+        Take a one-off task on dataset_id (e.g. resuming an interrupted load).
+        True for exactly one caller per key, across workers. With modified_ns
+        (the entry stamp the caller acted on) the claim also fails once the
+        entry has changed, so a key released after its task cannot be taken
+        again by a caller that read the entry before. release() it when done.
+        """
+        try:
+            fd = os.open(self._claim_path(dataset_id, key), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        os.close(fd)
+        if modified_ns is not None:
+            try:
+                current = self.modified_ns(dataset_id)
+            except KeyError:
+                current = None
+            if current != modified_ns:
+                self.release(dataset_id, key)
+                return False
+        return True
+
+    def release(self, dataset_id: str, key: str):
+        """Remove a claim whose task finished."""
+        try:
+            os.remove(self._claim_path(dataset_id, key))
+        except FileNotFoundError:
+            pass
+
+    def __contains__(self, dataset_id) -> bool:
+        return isinstance(dataset_id, str) and self._load(dataset_id) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        entries = []
+        for name in os.listdir(self.root):
+            if name.endswith(".json"):
+                hit = self._load(name[:-5])
+                if hit is not None:
+                    entries.append((hit[2], name[:-5]))
+        return iter([dataset_id for _, dataset_id in sorted(entries)])
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+def to_arrow(df: pd.DataFrame) -> pa.Table:
+    """
+    One chunk per column. Plain numpy numerics are passed through as-is (NaN
+    stays a value, no validity bitmap) so they can be mapped back zero-copy.
+    """
+    arrays, names = [], []
+    for col in df.columns:
+        s = df[col]
+        if isinstance(s.dtype, np.dtype) and s.dtype.kind in "iufM":
+            arr = pa.array(s.to_numpy())
+        else:
+            try:
+                arr = pa.Array.from_pandas(s)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                # mixed-type object column (e.g. ints and strings from a CSV)
+                arr = pa.Array.from_pandas(s.astype("string"))
+        arrays.append(arr)
+        names.append(str(col))
+    return pa.Table.from_arrays(arrays, names=names)
+
+
+def _fill_numeric_nulls(table: pa.Table) -> pa.Table:
+    """
+    Turn numeric nulls into NaN values the way pandas stores them (ints with
+    nulls become float64), so the columns still map back zero-copy.
+    """
+    columns = []
+    for col in table.columns:
+        if col.null_count and (pa.types.is_integer(col.type) or pa.types.is_floating(col.type)):
+            if pa.types.is_integer(col.type):
+                col = col.cast(pa.float64())
+            col = pc.fill_null(col, float("nan"))
+        columns.append(col)
+    return pa.Table.from_arrays(columns, names=table.column_names)
+
+
+class LazyColumnCache:
+    """LRU of columns read from lazy parquet datasets, keyed by (dataset_id, version, column)."""
+
+    def __init__(self, max_bytes: int):
+        self._lru = LRUCache(max_bytes)
+        self.reads = 0
+
+    def get(self, key: Tuple[str, int, str]) -> Optional[pd.Series]:
+        return self._lru.get(key)
+
+    def put(self, key: Tuple[str, int, str], s: pd.Series, pinned: Iterable[Tuple[str, int, str]] = ()):
+        """Add a column, evicting least recently used ones (except pinned) over budget."""
+        with self._lru.lock:
+            self.reads += 1
+            self._lru.put(key, s, int(s.memory_usage(index=False, deep=False)), set(pinned) | {key})
+
+    def stats(self) -> Dict[str, Any]:
+        lru = self._lru
+        with lru.lock:
+            per_dataset: Dict[str, Dict[str, int]] = {}
+            for (ds, _, col), _, size in lru.items():
+                per_dataset.setdefault(ds, {})[col] = size
+            return {
+                "bytes": lru.size,
+                "max_bytes": lru.max_size,
+                "reads": self.reads,
+                "hits": lru.hits,
+                "evictions": lru.evictions,
+                "datasets": per_dataset,
+            }
+
+
+def prune_row_groups(pf: pq.ParquetFile, predicates: List[RowFilter]) -> List[int]:
+    """Row groups whose statistics allow a row passing every filter."""
+    schema = pf.schema_arrow
+    positions = {
+        pf.metadata.schema.column(i).path: i
+        for i in range(pf.metadata.num_columns)
+    }
+    keep = []
+    for rg in range(pf.metadata.num_row_groups):
+        meta = pf.metadata.row_group(rg)
+        if all(
+            f.column not in positions
+            or row_group_may_match(f, meta.column(positions[f.column]).statistics, schema.field(f.column).type)
+            for f in predicates
+        ):
+            keep.append(rg)
+    return keep
+
+
+def parquet_stream_types(path: str) -> Dict[str, str]:
+    """
+    Casts that make batches read from a parquet file look like the frame
+    pd.read_parquet would build: integer columns holding nulls become
+    float64 and dictionary columns are decoded.
+    """
+    pf = pq.ParquetFile(path)
+    schema = pf.schema_arrow
+    casts = {}
+    for i in range(pf.metadata.num_columns):
+        name = pf.metadata.schema.column(i).path
+        if name not in schema.names:
+            continue
+        dtype = schema.field(name).type
+        if pa.types.is_dictionary(dtype):
+            casts[name] = str(dtype.value_type)
+        elif pa.types.is_integer(dtype):
+            for rg in range(pf.metadata.num_row_groups):
+                stats = pf.metadata.row_group(rg).column(i).statistics
+                if stats is None or not stats.has_null_count or stats.null_count:
+                    casts[name] = "double"
+                    break
+    return casts
+
+
+def parquet_schema(path: str) -> Tuple[int, List[str]]:
+    """Row count and data columns of a parquet file, from its footer only."""
+    pf = pq.ParquetFile(path)
+    columns = [name for name in pf.schema_arrow.names if not name.startswith("__index_level_")]
+    return pf.metadata.num_rows, columns
+
+
+class DatasetStore(Mapping):
+    """
+    dataset_id -> DataFrame backed by memory-mapped Arrow IPC files.
+    Frames are attached lazily, once per process and dataset version, and
+    must be treated as read-only. Only datasets with a published version
+    are members; the catalog also lists ones that are still loading.
+
+    Lazy datasets have a "parquet_path" in their catalog entry; use frame()
+    or column() for them, since indexing one materializes every column.
+    Datasets with storage="stream" are never loaded: iter_batches() reads
+    their source file in record batches.
+
+    Attached frames are kept in an LRU under max_resident_bytes (0 means no
+    limit). Evicting one only drops this process's frame: its Arrow file is
+    the spill copy and is mapped again on the next access.
+    """
+
+    def __init__(self, root: str, lazy_max_bytes: int = 1024 * 1024 * 1024,
+                 max_resident_bytes: int = 0):
+        self.root = root
+        self.data_dir = os.path.join(root, "data")
+        self.objects_dir = os.path.join(root, "objects")
+        os.makedirs(self.data_dir, exist_ok=True)
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.catalog = DatasetCatalog(os.path.join(root, "catalog"))
+        self.lazy_columns = LazyColumnCache(lazy_max_bytes)
+        self.max_resident_bytes = max_resident_bytes
+        # dataset_id -> (version, frame, bytes, last access), least recently used first
+        self._attached: "OrderedDict[str, Tuple[int, pd.DataFrame, int, float]]" = OrderedDict()
+        self._resident_bytes = 0
+        self._evicted: set = set()
+        self.evictions = 0
+        self.reloads = 0
+        self._lock = threading.Lock()
+
+    def _file(self, dataset_id: str, version: int) -> str:
+        return os.path.join(self.data_dir, f"{dataset_id}.v{version}.arrow")
+
+    def object_path(self, dataset_id: str, version: int, ext: str = "parquet") -> str:
+        """Where a downloaded source file (e.g. an S3 parquet object) is kept."""
+        return os.path.join(self.objects_dir, f"{dataset_id}.v{version}.{ext}")
+
+    def next_version(self, dataset_id: str) -> int:
+        return self.version(dataset_id) + 1
+
+    def is_lazy(self, dataset_id: str) -> bool:
+        try:
+            return bool(self.catalog[dataset_id].get("parquet_path"))
+        except KeyError:
+            return False
+
+    def is_streamed(self, dataset_id: str) -> bool:
+        try:
+            return self.catalog[dataset_id].get("storage") == "stream"
+        except KeyError:
+            return False
+
+    def iter_batches(self, dataset_id: str, columns: Iterable[str],
+                     predicates: List[RowFilter] = (),
+                     batch_rows: int = 1_000_000) -> Tuple[Iterator[pd.DataFrame], Optional[Dict[str, int]]]:
+        """
+        Stream a dataset registered with storage="stream" from its source file
+        as DataFrames of the requested columns. Parquet sources skip row
+        groups ruled out by the filters (counts are returned);
+        CSV sources are parsed block by block with the registered types.
+        """
+        meta = self.catalog[dataset_id]
+        path = meta["source_path"]
+        stored = list(meta.get("columns") or [])
+        wanted = [c for c in stored if c in set(columns)]
+        casts = {name: pa.type_for_alias(alias) for name, alias in (meta.get("stream_types") or {}).items()}
+        self._remove_stale_files(dataset_id, int(meta.get("version", 0)))
+
+        def to_frame(batch: pa.RecordBatch) -> pd.DataFrame:
+            table = pa.Table.from_batches([batch])
+            for name, dtype in casts.items():
+                if name in table.column_names and table.schema.field(name).type != dtype:
+                    i = table.column_names.index(name)
+                    table = table.set_column(i, name, table.column(name).cast(dtype))
+            table = _fill_numeric_nulls(table)
+            return table.to_pandas(split_blocks=True, types_mapper=_STRING_TYPES.get)
+
+        if meta.get("file_format", "").lower() == "parquet":
+            pf = pq.ParquetFile(path, memory_map=True)
+            groups = prune_row_groups(pf, list(predicates)) if predicates else list(range(pf.metadata.num_row_groups))
+            counts = None
+            if predicates:
+                counts = {
+                    "row_groups": pf.metadata.num_row_groups,
+                    "scanned": len(groups),
+                    "pruned": pf.metadata.num_row_groups - len(groups),
+                }
+
+            def parquet_batches():
+                if not groups or not wanted:
+                    # one empty batch still tells the caller the column types
+                    schema = pa.schema([pf.schema_arrow.field(c) for c in wanted])
+                    yield to_frame(pa.RecordBatch.from_arrays(
+                        [pa.array([], type=f.type) for f in schema], schema=schema
+                    ))
+                    return
+                for batch in pf.iter_batches(batch_size=batch_rows, row_groups=groups, columns=wanted):
+                    yield to_frame(batch)
+            return parquet_batches(), counts
+
+        def csv_batches():
+            if not wanted:
+                return
+            with open(path, "rb") as raw:
+                for batch in iter_csv_batches(raw, casts, include_columns=wanted):
+                    yield to_frame(batch)
+        return csv_batches(), None
+
+    def columns(self, dataset_id: str) -> List[str]:
+        return list(self.catalog[dataset_id].get("columns") or [])
+
+    def frame(self, dataset_id: str, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """
+        Frame holding at least the given stored columns (all when None).
+        In-memory datasets always return the full frame; lazy ones read any
+        column that is not cached yet and return just the requested ones.
+        """
+        meta = self.catalog[dataset_id]
+        if meta.get("storage") == "stream":
+            # out-of-core dataset: reads the requested columns in full
+            batches, _ = self.iter_batches(dataset_id, meta.get("columns") if columns is None else columns)
+            frames = list(batches)
+            if frames:
+                return pd.concat(frames, ignore_index=True)
+            return pd.DataFrame(index=pd.RangeIndex(0))
+        path = meta.get("parquet_path")
+        if not path:
+            return self[dataset_id]
+        version = int(meta.get("version", 0))
+        stored = list(meta.get("columns") or [])
+        wanted = stored if columns is None else [c for c in stored if c in set(columns)]
+        keys = [(dataset_id, version, c) for c in wanted]
+        cached = {c: self.lazy_columns.get(k) for c, k in zip(wanted, keys)}
+        missing = [c for c in wanted if cached[c] is None]
+        if missing:
+            table = pq.read_table(path, columns=missing, memory_map=True)
+            for name in missing:
+                s = table.column(name).to_pandas(types_mapper=_STRING_TYPES.get)
+                s.name = name
+                cached[name] = s
+                self.lazy_columns.put((dataset_id, version, name), s, pinned=keys)
+            self._remove_stale_files(dataset_id, version)
+        if not wanted:
+            return pd.DataFrame(index=pd.RangeIndex(int(meta.get("rows") or 0)))
+        return pd.concat([cached[c] for c in wanted], axis=1, copy=False)
+
+    def scan(self, dataset_id: str, columns: Iterable[str],
+             predicates: List[RowFilter]) -> Tuple[pd.DataFrame, np.ndarray, Dict[str, int]]:
+        """
+        Read only the row groups of a lazy dataset whose statistics allow a
+        match for every filter. Returns the frame, the positions
+        of its rows in the full dataset and row-group counts. Nothing is
+        added to the column cache.
+        """
+        meta = self.catalog[dataset_id]
+        stored = list(meta.get("columns") or [])
+        wanted = [c for c in stored if c in set(columns)]
+        pf = pq.ParquetFile(meta["parquet_path"], memory_map=True)
+        groups = prune_row_groups(pf, predicates)
+        starts = np.cumsum([0] + [pf.metadata.row_group(i).num_rows for i in range(pf.metadata.num_row_groups)])
+        positions = (
+            np.concatenate([np.arange(starts[i], starts[i + 1]) for i in groups])
+            if groups else np.zeros(0, dtype=np.int64)
+        )
+        table = pf.read_row_groups(groups, columns=wanted) if groups else pf.schema_arrow.empty_table().select(wanted)
+        df = pd.concat(
+            [table.column(c).to_pandas(types_mapper=_STRING_TYPES.get).rename(c) for c in wanted],
+            axis=1, copy=False,
+        ) if wanted else pd.DataFrame(index=pd.RangeIndex(len(positions)))
+        counts = {
+            "row_groups": pf.metadata.num_row_groups,
+            "scanned": len(groups),
+            "pruned": pf.metadata.num_row_groups - len(groups),
+        }
+        return df, positions, counts
+
+    def column(self, dataset_id: str, column: str) -> pd.Series:
+        return self.frame(dataset_id, [column])[column]
+
+    def has_files(self, dataset_id: str) -> bool:
+        """Whether the files the published version reads from are still on disk."""
+        meta = self.catalog[dataset_id]
+        if meta.get("parquet_path"):
+            return os.path.exists(meta["parquet_path"])
+        if meta.get("storage") == "stream":
+            return os.path.exists(meta["source_path"])
+        return os.path.exists(self._file(dataset_id, int(meta.get("version", 0))))
+
+    def version(self, dataset_id: str) -> int:
+        try:
+            return int(self.catalog[dataset_id].get("version", 0))
+        except KeyError:
+            return 0
+
+    def put(self, dataset_id: str, data: Union[pd.DataFrame, pa.Table]) -> int:
+        """
+        Write data as the next version of dataset_id and return that version.
+        Arrow tables (e.g. from the streaming CSV reader) are written as-is,
+        without a round trip through pandas.
+        The catalog entry is not touched; callers publish the new version by
+        writing its metadata (with "version") to the catalog afterwards.
+        """
+        version = self.version(dataset_id) + 1
+        if isinstance(data, pa.Table):
+            table = _fill_numeric_nulls(data.combine_chunks())
+        else:
+            table = to_arrow(data)
+        path = self._file(dataset_id, version)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with pa.OSFile(tmp, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp, path)
+        return version
+
+    def table(self, dataset_id: str) -> pa.Table:
+        """The published version of an in-memory dataset as a memory-mapped Arrow table."""
+        version = self.version(dataset_id)
+        source = pa.memory_map(self._file(dataset_id, version), "r")
+        return pa.ipc.open_file(source).read_all()
+
+    def _attach(self, dataset_id: str, version: int) -> pd.DataFrame:
+        # The memory map stays open for as long as any column references it
+        source = pa.memory_map(self._file(dataset_id, version), "r")
+        table = pa.ipc.open_file(source).read_all()
+        return table.to_pandas(split_blocks=True, types_mapper=_STRING_TYPES.get)
+
+    def __getitem__(self, dataset_id: str) -> pd.DataFrame:
+        meta = self.catalog[dataset_id]
+        if meta.get("parquet_path") or meta.get("storage") == "stream":
+            return self.frame(dataset_id)
+        version = int(meta.get("version", 0))
+        with self._lock:
+            hit = self._attached.get(dataset_id)
+            if hit is not None and hit[0] == version:
+                self._attached[dataset_id] = hit[:3] + (time.time(),)
+                self._attached.move_to_end(dataset_id)
+                return hit[1]
+        try:
+            df = self._attach(dataset_id, version)
+        except FileNotFoundError:
+            raise KeyError(dataset_id)
+        size = int(df.memory_usage(index=False, deep=False).sum())
+        with self._lock:
+            old = self._attached.pop(dataset_id, None)
+            if old is not None:
+                self._resident_bytes -= old[2]
+            if dataset_id in self._evicted:
+                self._evicted.discard(dataset_id)
+                self.reloads += 1
+            self._attached[dataset_id] = (version, df, size, time.time())
+            self._resident_bytes += size
+            self._enforce_budget(keep=dataset_id)
+        self._remove_stale_files(dataset_id, version)
+        return df
+
+    def _enforce_budget(self, keep: str):
+        # callers hold self._lock; frames still used by a running request
+        # stay alive through their references and are freed when it ends
+        if not self.max_resident_bytes:
+            return
+        for dataset_id in list(self._attached):
+            if self._resident_bytes <= self.max_resident_bytes:
+                break
+            if dataset_id == keep:
+                continue
+            self._resident_bytes -= self._attached.pop(dataset_id)[2]
+            self._evicted.add(dataset_id)
+            self.evictions += 1
+
+    def detach(self, dataset_id: str) -> bool:
+        """Drop this process's frame for dataset_id; it is mapped again on next use."""
+        with self._lock:
+            hit = self._attached.pop(dataset_id, None)
+            if hit is None:
+                return False
+            self._resident_bytes -= hit[2]
+            self._evicted.add(dataset_id)
+            self.evictions += 1
+            return True
+
+    def _remove_stale_files(self, dataset_id: str, version: int):
+        """Delete older versions (newer ones may be written but not yet published)."""
+        prefix = f"{dataset_id}.v"
+        for directory, ext in ((self.data_dir, ".arrow"), (self.objects_dir, ".parquet"),
+                               (self.objects_dir, ".csv")):
+            for name in os.listdir(directory):
+                if not (name.startswith(prefix) and name.endswith(ext)):
+                    continue
+                try:
+                    old = int(name[len(prefix):-len(ext)])
+                except ValueError:
+                    continue
+                if old < version:
+                    try:
+                        os.remove(os.path.join(directory, name))
+                    except OSError:
+                        # still mapped by a worker on a platform that forbids it
+                        pass
+
+    def __contains__(self, dataset_id) -> bool:
+        # catalog entries without a version are still loading (or failed)
+        return isinstance(dataset_id, str) and self.version(dataset_id) > 0
+
+    def __iter__(self) -> Iterator[str]:
+        return iter([dataset_id for dataset_id in self.catalog if dataset_id in self])
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def resident(self) -> Dict[str, Dict[str, Any]]:
+        """Datasets attached in this process (least recently used first) and the size of their Arrow files."""
+        with self._lock:
+            attached = {k: (v[0], v[2], v[3]) for k, v in self._attached.items()}
+        out = {}
+        for dataset_id, (version, nbytes, last_used) in attached.items():
+            try:
+                size = os.path.getsize(self._file(dataset_id, version))
+            except OSError:
+                size = None
+            out[dataset_id] = {
+                "version": version, "bytes": nbytes, "file_bytes": size,
+                "last_used": round(last_used, 3),
+            }
+        return out
+
+    def memory_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                "resident_bytes": self._resident_bytes,
+                "max_resident_bytes": self.max_resident_bytes,
+                "attached": len(self._attached),
+                "evicted": sorted(self._evicted),
+                "evictions": self.evictions,
+                "reloads": self.reloads,
+            }
+        stats["datasets"] = self.resident()
+        return stats
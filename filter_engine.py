@@ -0,0 +1,138 @@
+# filter_engine.py
+# Row filters of pivot requests: a column, an operator and its operands.
+# A filter on a dictionary-encoded column (cached column index, categorical)
+# is evaluated once per distinct value and gathered through the row codes;
+# other columns are compared directly. Every filter of a request is AND-ed
+# into one boolean row selection. Parquet row-group statistics rule groups
+# out before anything is read.
+from typing import Any, Callable, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# eq: value; in / not_in: values; range: min and/or max (inclusive);
+# contains: substring of the value's text; is_null / not_null: no operand
+FILTER_OPS = ("eq", "in", "not_in", "range", "contains", "is_null", "not_null")
+# operators whose row-group statistics can rule a group out
+PRUNABLE_OPS = ("eq", "in", "range", "is_null", "not_null")
+
+
+class FilterError(Exception):
+    """A filter with an unknown operator, missing operands or operands that do not fit its column."""
+
+
+class RowFilter(NamedTuple):
+    column: str
+    op: str
+    operands: Tuple[Any, ...] = ()   # eq / contains: (value,); in / not_in: values; range: (low, high)
+
+
+def make_filter(column: str, op: str = "eq", value: Any = None, values: Iterable[Any] = (),
+                low: Any = None, high: Any = None) -> Optional[RowFilter]:
+    """
+    Validated filter, or None for one that keeps every row (eq or contains
+    without a value, a range without bounds). eq with a list means in.
+    """
+    op = (op or "eq").lower()
+    if op not in FILTER_OPS:
+        raise FilterError(f"unknown operator {op!r} on {column!r} (expected one of {', '.join(FILTER_OPS)})")
+    if op == "eq" and isinstance(value, (list, tuple)):
+        op, values = "in", value
+    if op in ("eq", "contains"):
+        return None if value is None else RowFilter(column, op, (value,))
+    if op in ("in", "not_in"):
+        return RowFilter(column, op, tuple(values or ()))
+    if op == "range":
+        return None if low is None and high is None else RowFilter(column, op, (low, high))
+    return RowFilter(column, op)
+
+
+def _match(values: pd.Series, f: RowFilter) -> np.ndarray:
+    """Mask of f over values. Nulls only pass is_null, and not_in unless listed."""
+    if f.op == "is_null":
+        return values.isna().to_numpy(dtype=bool)
+    if f.op == "not_null":
+        return values.notna().to_numpy(dtype=bool)
+    try:
+        if f.op == "eq":
+            hit = values == f.operands[0]
+        elif f.op in ("in", "not_in"):
+            # a None operand stands for every kind of null (None, NaN, NaT)
+            hit = values.isin([v for v in f.operands if v is not None])
+            if any(v is None for v in f.operands):
+                hit |= values.isna()
+        elif f.op == "range":
+            low, high = f.operands
+            hit = pd.Series(True, index=values.index)
+            if low is not None:
+                hit &= values >= low
+            if high is not None:
+                hit &= values <= high
+        else:   # contains
+            text = values if pd.api.types.is_string_dtype(values.dtype) else values.astype("string")
+            hit = text.str.contains(str(f.operands[0]), regex=False)
+    except (TypeError, ValueError) as e:
+        raise FilterError(f"{f.op} on {f.column!r} with {list(f.operands)}: {e}")
+    hit = hit.astype("boolean").fillna(False).to_numpy(dtype=bool)
+    return ~hit if f.op == "not_in" else hit
+
+
+def code_mask(codes: np.ndarray, uniques: pd.Index, f: RowFilter) -> np.ndarray:
+    """Mask of f for dictionary-encoded rows: one test per distinct value."""
+    return _match(pd.Series(uniques), f)[codes]
+
+
+def column_mask(s: pd.Series, f: RowFilter) -> np.ndarray:
+    """Mask of f over a column; categoricals are tested on their categories."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        cats = s.cat.categories
+        codes = np.asarray(s.cat.codes, dtype=np.int64)
+        # code -1 (null) reads the trailing slot
+        uniques = pd.Index(np.asarray(cats), dtype=cats.dtype).insert(len(cats), np.nan)
+        return code_mask(np.where(codes < 0, len(cats), codes), uniques, f)
+    return _match(s, f)
+
+
+Encoded = Optional[Tuple[np.ndarray, pd.Index]]
+
+
+def select_rows(filters: List[RowFilter], column: Callable[[str], pd.Series],
+                encoded: Callable[[str], Encoded] = lambda col: None) -> Optional[np.ndarray]:
+    """
+    Boolean selection of the rows passing every filter (None without
+    filters). encoded(col) may supply the rows' dictionary codes and
+    uniques; otherwise column(col) is tested directly.
+    """
+    keep = None
+    for f in filters:
+        enc = encoded(f.column)
+        mask = code_mask(enc[0], enc[1], f) if enc is not None else column_mask(column(f.column), f)
+        keep = mask if keep is None else np.logical_and(keep, mask, out=keep)
+    return keep
+
+
+def row_group_may_match(f: RowFilter, stats, dtype: pa.DataType) -> bool:
+    """False only when the row-group statistics prove no row passes f."""
+    if stats is None:
+        return True
+    if f.op == "is_null":
+        return not stats.has_null_count or stats.null_count > 0
+    if f.op == "not_null":
+        return stats.num_values > 0
+    if f.op not in PRUNABLE_OPS or not stats.has_min_max:
+        return True
+    try:
+        def cast(v):
+            return pa.scalar(v).cast(dtype).as_py()
+        if f.op == "eq":
+            v = cast(f.operands[0])
+            return stats.min <= v <= stats.max
+        if f.op == "in":
+            if any(v is None for v in f.operands):
+                return True   # nulls are not covered by min/max
+            return any(stats.min <= cast(v) <= stats.max for v in f.operands)
+        low, high = f.operands
+        return (low is None or cast(low) <= stats.max) and (high is None or cast(high) >= stats.min)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError, TypeError):
+        return True
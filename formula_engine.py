@@ -0,0 +1,674 @@
+# formula_engine.py
+# Parser and compiler for QuickSight-style calculated-field formulas.
+#
+# A formula is parsed once into a small AST and compiled into a tree of
+# closures over whole columns (every operation is one vectorized pandas/NumPy
+# call). Compiled plans are cached by formula text plus the frame's schema,
+# so repeated pivots go straight to evaluation.
+#
+# Language:
+#   {Field Name} or a bare column name, numbers, 'text' / "text",
+#   true / false / null,
+#   + - * / %, = == != <> < <= > >=, AND OR NOT (also & | ~ !),
+#   ifelse(cond, then, [cond, then, ...] else), isnull, isnotnull,
+#   coalesce, abs, ceil, floor, round, ln, pow, upper, lower, trim, len,
+#   contains, startswith, endswith, replace, concat, parseDate.
+#
+# Aggregate-level formulas call sum, avg, min, max, count or distinct_count
+# over row-level expressions, e.g. sum({profit}) / sum({sales}); they are
+# split into per-group measures plus a formula over the grouped result.
+import re
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from lru_cache import LRUCache
+
+
+class FormulaError(Exception):
+    """A formula that does not parse, refers to unknown names or fails to evaluate."""
+
+
+# -----------------------------
+# Tokenizer
+# -----------------------------
+_TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+  | (?P<field>\{[^{}]*\})
+  | (?P<ident>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<op><=|>=|<>|!=|==|&&|\|\||[-+*/%=<>(),&|~!])
+""", re.VERBOSE)
+
+
+class Token(NamedTuple):
+    kind: str    # number, string, field, ident, op, end
+    value: str
+    pos: int
+
+
+def _unquote(text: str) -> str:
+    return re.sub(r"\\(.)", r"\1", text[1:-1])
+
+
+def tokenize(formula: str) -> List[Token]:
+    tokens, pos = [], 0
+    while pos < len(formula):
+        m = _TOKEN_RE.match(formula, pos)
+        if m is None:
+            raise FormulaError(f"unexpected character {formula[pos]!r} at position {pos}")
+        kind = m.lastgroup
+        if kind != "ws":
+            tokens.append(Token(kind, m.group(), pos))
+        pos = m.end()
+    tokens.append(Token("end", "", pos))
+    return tokens
+
+
+# -----------------------------
+# Parser
+# -----------------------------
+class Literal(NamedTuple):
+    value: Any
+
+
+class Field(NamedTuple):
+    name: str       # {Name}: always a column reference
+
+
+class Name(NamedTuple):
+    name: str       # bare identifier: a column, true/false/null
+    pos: int
+
+
+class Call(NamedTuple):
+    func: str
+    args: Tuple[Any, ...]
+    pos: int
+
+
+class Unary(NamedTuple):
+    op: str
+    operand: Any
+
+
+class Binary(NamedTuple):
+    op: str
+    left: Any
+    right: Any
+
+
+_OR = {"or", "|", "||"}
+_AND = {"and", "&", "&&"}
+_NOT = {"not", "~", "!"}
+_COMPARE = {"=": "==", "==": "==", "!=": "!=", "<>": "!=", "<": "<", "<=": "<=", ">": ">", ">=": ">="}
+
+
+class _Parser:
+    """Recursive descent, lowest precedence first: OR, AND, NOT, comparison, + -, * / %, unary."""
+
+    def __init__(self, formula: str):
+        self.tokens = tokenize(formula)
+        self.i = 0
+
+    def peek(self) -> Token:
+        return self.tokens[self.i]
+
+    def next(self) -> Token:
+        tok = self.tokens[self.i]
+        self.i += 1
+        return tok
+
+    def at(self, words: Set[str]) -> bool:
+        tok = self.peek()
+        return tok.kind in ("op", "ident") and tok.value.lower() in words
+
+    def expect(self, value: str) -> Token:
+        tok = self.next()
+        if tok.value != value:
+            found = repr(tok.value) if tok.kind != "end" else "end of formula"
+            raise FormulaError(f"expected {value!r} at position {tok.pos}, found {found}")
+        return tok
+
+    def parse(self):
+        node = self.or_expr()
+        tok = self.peek()
+        if tok.kind != "end":
+            raise FormulaError(f"unexpected {tok.value!r} at position {tok.pos}")
+        return node
+
+    def or_expr(self):
+        node = self.and_expr()
+        while self.at(_OR):
+            self.next()
+            node = Binary("|", node, self.and_expr())
+        return node
+
+    def and_expr(self):
+        node = self.not_expr()
+        while self.at(_AND):
+            self.next()
+            node = Binary("&", node, self.not_expr())
+        return node
+
+    def not_expr(self):
+        if self.at(_NOT):
+            self.next()
+            return Unary("~", self.not_expr())
+        return self.comparison()
+
+    def comparison(self):
+        node = self.additive()
+        tok = self.peek()
+        if tok.kind == "op" and tok.value in _COMPARE:
+            self.next()
+            node = Binary(_COMPARE[tok.value], node, self.additive())
+        return node
+
+    def additive(self):
+        node = self.term()
+        while self.peek().kind == "op" and self.peek().value in ("+", "-"):
+            node = Binary(self.next().value, node, self.term())
+        return node
+
+    def term(self):
+        node = self.unary()
+        while self.peek().kind == "op" and self.peek().value in ("*", "/", "%"):
+            node = Binary(self.next().value, node, self.unary())
+        return node
+
+    def unary(self):
+        tok = self.peek()
+        if tok.kind == "op" and tok.value in ("-", "+"):
+            self.next()
+            operand = self.unary()
+            return operand if tok.value == "+" else Unary("-", operand)
+        return self.primary()
+
+    def primary(self):
+        tok = self.next()
+        if tok.kind == "number":
+            return Literal(float(tok.value) if any(c in tok.value for c in ".eE") else int(tok.value))
+        if tok.kind == "string":
+            return Literal(_unquote(tok.value))
+        if tok.kind == "field":
+            return Field(tok.value[1:-1])
+        if tok.kind == "ident":
+            if self.peek().value == "(":
+                self.next()
+                args = []
+                if self.peek().value != ")":
+                    args.append(self.or_expr())
+                    while self.peek().value == ",":
+                        self.next()
+                        args.append(self.or_expr())
+                self.expect(")")
+                return Call(tok.value.lower(), tuple(args), tok.pos)
+            return Name(tok.value, tok.pos)
+        if tok.value == "(":
+            node = self.or_expr()
+            self.expect(")")
+            return node
+        found = repr(tok.value) if tok.kind != "end" else "end of formula"
+        raise FormulaError(f"unexpected {found} at position {tok.pos}")
+
+
+def parse_formula(formula: str):
+    if not formula.strip():
+        raise FormulaError("empty formula")
+    return _Parser(formula).parse()
+
+
+_CONSTANTS = {"true": True, "false": False, "null": None}
+
+
+def _walk(node) -> Iterable[Any]:
+    yield node
+    if isinstance(node, Call):
+        for arg in node.args:
+            yield from _walk(arg)
+    elif isinstance(node, Unary):
+        yield from _walk(node.operand)
+    elif isinstance(node, Binary):
+        yield from _walk(node.left)
+        yield from _walk(node.right)
+
+
+def formula_references(formula: str, names: Iterable[str]) -> Set[str]:
+    """Columns a formula reads: every {field} plus bare identifiers that name a column."""
+    names = set(names)
+    refs = set()
+    for node in _walk(parse_formula(formula)):
+        if isinstance(node, Field):
+            refs.add(node.name)
+        elif isinstance(node, Name) and node.name in names:
+            refs.add(node.name)
+    return refs
+
+
+def evaluation_order(formulas: Dict[str, str], columns: Iterable[str],
+                     targets: Iterable[str]) -> List[str]:
+    """
+    Names of the calculated fields that targets depend on, dependencies
+    first. formulas maps field name -> formula and columns are the stored
+    columns; a reference to a field's name reads the field, except inside
+    its own formula, where it reads the stored column the field replaces.
+    Only reachable fields are parsed: cycles, references to unknown names
+    and uses of aggregate-level fields inside other formulas among them
+    raise FormulaError.
+    """
+    columns = set(columns)
+    names = columns | set(formulas)
+    order: List[str] = []
+    done: Set[str] = set()
+    path: List[str] = []   # fields being visited, for cycle reports
+    aggregate: Dict[str, bool] = {}
+
+    def visit(name: str):
+        if name in done:
+            return
+        if name in path:
+            cycle = path[path.index(name):] + [name]
+            raise FormulaError("circular reference between calculated fields: " + " -> ".join(cycle))
+        path.append(name)
+        try:
+            refs = formula_references(formulas[name], names)
+            aggregate[name] = is_aggregate(formulas[name])
+        except FormulaError as e:
+            raise FormulaError(f"calculated field {name!r}: {e}")
+        for ref in sorted(refs):
+            if ref == name and ref in columns:
+                continue
+            if ref in formulas:
+                visit(ref)
+                if aggregate[ref]:
+                    raise FormulaError(
+                        f"calculated field {name!r} cannot use aggregate field {{{ref}}}"
+                    )
+            elif ref not in columns:
+                raise FormulaError(f"calculated field {name!r} refers to unknown field {{{ref}}}")
+        path.pop()
+        done.add(name)
+        order.append(name)
+
+    for target in targets:
+        if target in formulas:
+            visit(target)
+    return order
+
+
+def _render(node, names: Set[str]) -> str:
+    if isinstance(node, Literal):
+        if isinstance(node.value, str):
+            # quoted so that the rendered text parses back to the same value
+            return "'%s'" % node.value.replace("\\", "\\\\").replace("'", "\\'")
+        return repr(node.value)
+    if isinstance(node, Field):
+        return "{%s}" % node.name
+    if isinstance(node, Name):
+        return "{%s}" % node.name if node.name in names else node.name.lower()
+    if isinstance(node, Call):
+        return "%s(%s)" % (node.func, ", ".join(_render(arg, names) for arg in node.args))
+    if isinstance(node, Unary):
+        return "(%s%s)" % (node.op, _render(node.operand, names))
+    return "(%s %s %s)" % (_render(node.left, names), node.op, _render(node.right, names))
+
+
+def normalize_formula(formula: str, names: Iterable[str]) -> str:
+    """
+    Canonical text of a formula: spacing, keyword case, operator spellings
+    (<> / !=, AND / &) and redundant parentheses no longer matter.
+    """
+    return _render(parse_formula(formula), set(names))
+
+
+# -----------------------------
+# Aggregate-level formulas
+# -----------------------------
+# Aggregate function -> pivot aggfunc of its measure
+AGGREGATES = {
+    "sum": "sum", "avg": "mean", "min": "min", "max": "max",
+    "count": "count", "distinct_count": "nunique",
+}
+
+
+def is_aggregate(formula: str) -> bool:
+    """True when the formula calls an aggregate function (sum, avg, ...)."""
+    return any(isinstance(node, Call) and node.func in AGGREGATES for node in _walk(parse_formula(formula)))
+
+
+def split_aggregate(formula: str, names: Iterable[str], measure: Callable[[str, str], str]) -> str:
+    """
+    Rewrite an aggregate-level formula into the formula evaluated once per
+    group. Every aggregate call becomes a reference to the column that
+    measure(aggfunc, row-level formula) names; fields may only be used
+    inside aggregate calls, and aggregates do not nest.
+    """
+    names = set(names)
+
+    def rewrite(node):
+        if isinstance(node, Call) and node.func in AGGREGATES:
+            if len(node.args) != 1:
+                raise FormulaError(
+                    f"{node.func}() takes 1 argument, got {len(node.args)} (position {node.pos})"
+                )
+            for inner in _walk(node.args[0]):
+                if isinstance(inner, Call) and inner.func in AGGREGATES:
+                    raise FormulaError(f"{inner.func}() inside {node.func}() at position {inner.pos}")
+            return Field(measure(AGGREGATES[node.func], _render(node.args[0], names)))
+        if isinstance(node, Field) or (isinstance(node, Name) and node.name in names):
+            raise FormulaError(f"field {{{node.name}}} must be inside an aggregate such as sum()")
+        if isinstance(node, Call):
+            return node._replace(args=tuple(rewrite(arg) for arg in node.args))
+        if isinstance(node, Unary):
+            return node._replace(operand=rewrite(node.operand))
+        if isinstance(node, Binary):
+            return node._replace(left=rewrite(node.left), right=rewrite(node.right))
+        return node
+
+    return _render(rewrite(parse_formula(formula)), set())
+
+
+# -----------------------------
+# Functions
+# -----------------------------
+def _is_series(x) -> bool:
+    return isinstance(x, pd.Series)
+
+
+def _str_method(name: str):
+    def call(x, *args):
+        if _is_series(x):
+            return getattr(x.str, name)(*args)
+        return None if x is None else getattr(str(x), name)(*args)
+    return call
+
+
+def _str_len(x):
+    return x.str.len() if _is_series(x) else (None if x is None else len(str(x)))
+
+
+def _contains(x, pattern):
+    if _is_series(x):
+        return x.str.contains(pattern, regex=False)
+    return None if x is None else pattern in str(x)
+
+
+def _replace(x, old, new):
+    if _is_series(x):
+        return x.str.replace(old, new, regex=False)
+    return None if x is None else str(x).replace(old, new)
+
+
+def _as_text(x):
+    return x.astype(str) if _is_series(x) else str(x)
+
+
+def _concat(*parts):
+    out = _as_text(parts[0])
+    for part in parts[1:]:
+        out = out + _as_text(part)
+    return out
+
+
+def _isnull(x):
+    return pd.isnull(x)
+
+
+def _isnotnull(x):
+    return pd.notnull(x)
+
+
+def _coalesce(*args):
+    out = args[0]
+    for arg in args[1:]:
+        if _is_series(out):
+            out = out.fillna(arg)
+        elif out is None or (isinstance(out, float) and np.isnan(out)):
+            out = arg
+    return out
+
+
+def _ifelse(*args):
+    if len(args) % 2 == 0:
+        raise FormulaError("ifelse needs condition/value pairs and a final else value")
+    out = args[-1]
+    for i in range(len(args) - 3, -1, -2):
+        cond = args[i]
+        if _is_series(cond):
+            cond = cond.fillna(False).astype(bool)
+        out = np.where(cond, args[i + 1], out)
+    return out
+
+
+_DATE_TOKENS = [("yyyy", "%Y"), ("yy", "%y"), ("MM", "%m"), ("dd", "%d"),
+                ("HH", "%H"), ("mm", "%M"), ("ss", "%S")]
+
+
+def _parse_date(x, fmt=None):
+    if fmt is not None and "%" not in fmt:
+        for token, code in _DATE_TOKENS:
+            fmt = fmt.replace(token, code)
+    return pd.to_datetime(x, format=fmt)
+
+
+def _round(x, digits=0):
+    return np.round(x, int(digits))
+
+
+# name -> (min args, max args or None for any, implementation)
+_FUNCTIONS: Dict[str, Tuple[int, Optional[int], Callable]] = {
+    "ifelse": (3, None, _ifelse),
+    "isnull": (1, 1, _isnull),
+    "isnotnull": (1, 1, _isnotnull),
+    "coalesce": (1, None, _coalesce),
+    "abs": (1, 1, np.abs),
+    "ceil": (1, 1, np.ceil),
+    "floor": (1, 1, np.floor),
+    "round": (1, 2, _round),
+    "ln": (1, 1, np.log),
+    "pow": (2, 2, np.power),
+    "upper": (1, 1, _str_method("upper")),
+    "lower": (1, 1, _str_method("lower")),
+    "trim": (1, 1, _str_method("strip")),
+    "len": (1, 1, _str_len),
+    "contains": (2, 2, _contains),
+    "startswith": (2, 2, _str_method("startswith")),
+    "endswith": (2, 2, _str_method("endswith")),
+    "replace": (3, 3, _replace),
+    "concat": (1, None, _concat),
+    "parsedate": (1, 2, _parse_date),
+}
+
+# functions that read their column arguments as text
+_TEXT_FUNCTIONS = {"upper", "lower", "trim", "len", "contains", "startswith", "endswith",
+                   "replace", "concat"}
+
+_BINARY: Dict[str, Callable[[Any, Any], Any]] = {
+    "+": lambda a, b: a + b,
+    "-": lambda a, b: a - b,
+    "*": lambda a, b: a * b,
+    "/": lambda a, b: a / b,
+    "%": lambda a, b: a % b,
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "&": lambda a, b: a & b,
+    "|": lambda a, b: a | b,
+}
+
+
+def _logical_not(x):
+    return ~x if _is_series(x) or isinstance(x, np.ndarray) else not x
+
+
+# -----------------------------
+# Compiler
+# -----------------------------
+def formula_input(s: pd.Series) -> pd.Series:
+    """
+    A column the way formulas see it: integers narrowed at ingest are widened
+    to int64 (so arithmetic does not wrap) and categoricals are plain values.
+    """
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.astype(object)
+    if s.dtype.kind in "iu" and s.dtype.itemsize < 8:
+        return s.astype(np.int64)
+    return s
+
+
+class _Columns:
+    """Column loader for one evaluation; each input is prepared once."""
+
+    def __init__(self, df: pd.DataFrame, date_formats: Optional[Dict[str, str]] = None):
+        self.df = df
+        self.date_formats = date_formats or {}
+        self._cache: Dict[str, pd.Series] = {}
+        self._text: Dict[str, pd.Series] = {}
+
+    def __getitem__(self, name: str) -> pd.Series:
+        s = self._cache.get(name)
+        if s is None:
+            s = self._cache[name] = formula_input(self.df[name])
+        return s
+
+    def text(self, name: str) -> pd.Series:
+        """The column for string functions: dates parsed at ingest in their source format."""
+        s = self._text.get(name)
+        if s is None:
+            s = self[name]
+            fmt = self.date_formats.get(name)
+            if fmt is not None and pd.api.types.is_datetime64_any_dtype(s.dtype):
+                s = s.dt.strftime(fmt).astype("string")
+            self._text[name] = s
+        return s
+
+
+Step = Callable[[_Columns], Any]
+
+
+def _compile(node, names: Set[str]) -> Tuple[Step, bool]:
+    """(step, constant) for node; constant steps are folded at compile time."""
+    if isinstance(node, Literal):
+        value = node.value
+        return (lambda cols: value), True
+    if isinstance(node, Field):
+        if node.name not in names:
+            raise FormulaError(f"unknown field {{{node.name}}}")
+        name = node.name
+        return (lambda cols: cols[name]), False
+    if isinstance(node, Name):
+        if node.name in names:
+            name = node.name
+            return (lambda cols: cols[name]), False
+        if node.name.lower() in _CONSTANTS:
+            value = _CONSTANTS[node.name.lower()]
+            return (lambda cols: value), True
+        raise FormulaError(f"unknown field {node.name!r} at position {node.pos}")
+    if isinstance(node, Unary):
+        operand, constant = _compile(node.operand, names)
+        fn = _logical_not if node.op == "~" else (lambda x: -x)
+        step = lambda cols: fn(operand(cols))
+    elif isinstance(node, Binary):
+        (left, lconst), (right, rconst) = _compile(node.left, names), _compile(node.right, names)
+        fn = _BINARY[node.op]
+        constant = lconst and rconst
+        step = lambda cols: fn(left(cols), right(cols))
+    elif isinstance(node, Call):
+        if node.func in AGGREGATES:
+            raise FormulaError(
+                f"aggregate {node.func}() cannot be used in a row-level formula (position {node.pos})"
+            )
+        if node.func not in _FUNCTIONS:
+            raise FormulaError(f"unknown function {node.func}() at position {node.pos}")
+        lo, hi, fn = _FUNCTIONS[node.func]
+        if len(node.args) < lo or (hi is not None and len(node.args) > hi):
+            expected = str(lo) if lo == hi else f"{lo}+" if hi is None else f"{lo}-{hi}"
+            raise FormulaError(
+                f"{node.func}() takes {expected} arguments, got {len(node.args)} (position {node.pos})"
+            )
+        compiled = [_compile(arg, names) for arg in node.args]
+        args = [step for step, _ in compiled]
+        if node.func in _TEXT_FUNCTIONS:
+            for i, arg in enumerate(node.args):
+                if isinstance(arg, Field) or (isinstance(arg, Name) and arg.name in names):
+                    args[i] = (lambda name: lambda cols: cols.text(name))(arg.name)
+        constant = all(c for _, c in compiled)
+        step = lambda cols: fn(*[arg(cols) for arg in args])
+    else:
+        raise FormulaError(f"cannot compile {node!r}")
+    if constant:
+        try:
+            value = step(None)
+        except Exception as e:
+            raise FormulaError(str(e))
+        return (lambda cols: value), True
+    return step, False
+
+
+class CompiledFormula:
+    """A formula compiled against a schema; evaluate() runs it over a frame."""
+
+    def __init__(self, formula: str, names: Iterable[str]):
+        self.formula = formula
+        node = parse_formula(formula)
+        names = set(names)
+        self._step, _ = _compile(node, names)
+        self.columns = formula_references(formula, names)
+        self.normalized = _render(node, names)
+        # a formula that is just one column: evaluation returns that column
+        self.reference = node.name if isinstance(node, Field) or (
+            isinstance(node, Name) and node.name in names) else None
+
+    def evaluate(self, df: pd.DataFrame, date_formats: Optional[Dict[str, str]] = None) -> Any:
+        """
+        Result over df. date_formats maps columns stored as timestamps to the
+        text format they were parsed from; string functions see that text.
+        """
+        try:
+            result = self._step(_Columns(df, date_formats))
+            if isinstance(result, np.ndarray) and result.ndim == 1 and len(result) == len(df):
+                # np.where (ifelse) and numpy functions of constants: one value per row
+                result = pd.Series(result, index=df.index)
+            return result
+        except FormulaError:
+            raise
+        except Exception as e:
+            raise FormulaError(f"{type(e).__name__}: {e}") from e
+
+
+Schema = Tuple[Tuple[str, str], ...]
+
+
+def frame_schema(df: pd.DataFrame) -> Schema:
+    return tuple((str(col), str(dtype)) for col, dtype in df.dtypes.items())
+
+
+class FormulaPlanCache:
+    """Thread-safe LRU of compiled formulas keyed by (formula text, schema)."""
+
+    def __init__(self, max_entries: int = 1024):
+        self._lru = LRUCache(max_entries)   # every plan counts 1
+
+    def get(self, formula: str, schema: Schema) -> CompiledFormula:
+        key = (formula.strip(), schema)
+        plan = self._lru.get(key)
+        if plan is None:
+            plan = CompiledFormula(key[0], [name for name, _ in schema])
+            self._lru.put(key, plan, 1)
+        return plan
+
+    def stats(self) -> Dict[str, int]:
+        lru = self._lru
+        with lru.lock:
+            return {
+                "entries": len(lru),
+                "max_entries": lru.max_size,
+                "hits": lru.hits,
+                "misses": lru.misses,
+            }
\ No newline at end of file
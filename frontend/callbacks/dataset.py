@@ -46,27 +46,48 @@ def register_dataset_callbacks(app):
     # ============================
     # Render Datasets List
     # ============================
-    def render_datasets(datasets):
+    def render_dataset_status(d, progress):
+        status = d.get("status", "ready")
+
+        if status == "failed":
+            return html.Div(f"Failed: {d.get('error') or 'unknown error'}", className="text-danger mt-2")
+
+        if status == "loading":
+            percent = (progress or {}).get("percent")
+            rows = (progress or {}).get("rows_read") or 0
+            return dbc.Progress(
+                value=percent if percent is not None else 100,
+                label=f"{percent:.0f}%" if percent is not None else f"{rows:,} rows",
+                striped=True,
+                animated=True,
+                className="mt-2"
+            )
+
+        return dbc.Button(
+            "Use",
+            id={"type": "use-dataset", "id": d["id"]},
+            size="sm",
+            className="mt-2"
+        )
+
+    def render_datasets(datasets, progress=None):
         if not datasets:
             return html.Div("No datasets yet.", className="text-muted")
 
         items = []
         for d in datasets:
+            status = d.get("status", "ready")
             items.append(
                 dbc.ListGroupItem([
                     html.Div([
                         html.Strong(d.get("name", d.get("id"))),
                         html.Span(
-                            f" • {d.get('source_type','?')}/{d.get('file_format','?')}",
+                            f" • {d.get('source_type','?')}/{d.get('file_format','?')}"
+                            + (f" • {status}" if status != "ready" else ""),
                             className="text-muted ms-2"
                         )
                     ]),
-                    dbc.Button(
-                        "Use",
-                        id={"type": "use-dataset", "id": d["id"]},
-                        size="sm",
-                        className="mt-2"
-                    )
+                    render_dataset_status(d, (progress or {}).get(d["id"]))
                 ])
             )
 
@@ -74,26 +95,54 @@ def register_dataset_callbacks(app):
 
 
     # ============================
-    # Load Datasets
+    # Load Datasets (polls while any dataset is loading)
     # ============================
     @app.callback(
         Output("datasets-list", "children"),
-        Input("datasets_refresh_store", "data")
+        Output("ingest-poll", "disabled"),
+        Output("ingest_jobs_store", "data"),
+        Input("datasets_refresh_store", "data"),
+        Input("ingest-poll", "n_intervals"),
+        State("ingest_jobs_store", "data")
     )
-    def load_datasets(_):
+    def load_datasets(_, __, pending):
         datasets, err = get_json(DATASETS_URL)
 
         if err:
-            return html.Div(f"Failed to load datasets: {err}", className="text-danger")
+            return html.Div(f"Failed to load datasets: {err}", className="text-danger"), True, no_update
 
-        return render_datasets(datasets or [])
+        datasets = datasets or []
+        progress = {}
+        for d in datasets:
+            if d.get("status") == "loading":
+                data, err = get_json(f"{DATASETS_URL}/{d['id']}/progress")
+                if not err:
+                    progress[d["id"]] = data
+
+        # datasets added from this page are activated once they are ready
+        status = {d["id"]: d.get("status", "ready") for d in datasets}
+        still_pending = []
+        for ds_id in pending or []:
+            if status.get(ds_id) == "ready":
+                try:
+                    act = requests.post(f"{API_BASE}/api/activate_dataset/{ds_id}", timeout=10)
+                    act.raise_for_status()
+                except Exception as e:
+                    print("Warning: failed to activate dataset:", e)
+            elif status.get(ds_id) == "loading":
+                still_pending.append(ds_id)
+
+        loading = any(s == "loading" for s in status.values())
+        jobs_update = still_pending if still_pending != (pending or []) else no_update
+        return render_datasets(datasets, progress), not loading, jobs_update
 
 
     # ============================
-    # Add Dataset
+    # Add Dataset (registration runs in the background)
     # ============================
     @app.callback(
         Output("datasets_refresh_store", "data"),
+        Output("ingest_jobs_store", "data", allow_duplicate=True),
         Input("ds-add", "n_clicks"),
         State("ds-name", "value"),
         State("ds-source-type", "value"),
@@ -102,12 +151,13 @@ def register_dataset_callbacks(app):
         State("ds-s3-key", "value"),
         State("ds-local-path", "value"),
         State("datasets_refresh_store", "data"),
+        State("ingest_jobs_store", "data"),
         prevent_initial_call=True
     )
     def add_dataset(n_clicks, name, source_type, file_format,
-                    s3_bucket, s3_key, local_path, refresh_counter):
+                    s3_bucket, s3_key, local_path, refresh_counter, pending):
         if not n_clicks:
-            return no_update
+            return no_update, no_update
 
         payload = {
             "name": name or "",
@@ -123,23 +173,19 @@ def register_dataset_callbacks(app):
         elif source_type == "local":
             payload["local_path"] = (local_path or "").strip()
 
+        pending = list(pending or [])
         try:
             res = requests.post(DATASETS_URL, json=payload, timeout=30)
             res.raise_for_status()
 
             ds_id = res.json().get("id")
-
             if ds_id:
-                try:
-                    act = requests.post(f"{API_BASE}/api/activate_dataset/{ds_id}", timeout=10)
-                    act.raise_for_status()
-                except Exception as e:
-                    print("Warning: failed to activate dataset:", e)
+                pending.append(ds_id)
 
         except Exception as e:
             print("Error adding dataset:", e)
 
-        return (refresh_counter or 0) + 1
+        return (refresh_counter or 0) + 1, pending
 
 
     # ============================
@@ -177,9 +223,10 @@ def register_dataset_callbacks(app):
     @app.callback(
         Output("table-dataset", "options"),
         Output("chart-dataset", "options"),
-        Input("datasets_refresh_store", "data")
+        Input("datasets_refresh_store", "data"),
+        Input("ingest_jobs_store", "data")
     )
-    def update_dataset_options(_):
+    def update_dataset_options(_, __):
         datasets, err = get_json(DATASETS_URL)
 
         if err:
@@ -188,6 +235,7 @@ def register_dataset_callbacks(app):
         options = [
             {"label": d.get("name", d.get("id")), "value": d["id"]}
             for d in (datasets or [])
+            if d.get("status", "ready") == "ready"
         ]
 
         return options, options
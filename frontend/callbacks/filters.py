@@ -1,7 +1,36 @@
-from dash import Input, Output, State, no_update, html, dcc
+from dash import Input, Output, State, MATCH, no_update, html, dcc
+from config import DATASETS_URL
+from services.api_client import get_json
 
 def register_filter_callbacks(app):
 
+    # Column profile of the table dataset: filter value options come from it
+    @app.callback(
+        Output("dataset_profile_store","data"),
+        Input("table-dataset","value")
+    )
+    def fetch_profile(dataset_id):
+        if not dataset_id:
+            return {}
+        data, err = get_json(f"{DATASETS_URL}/{dataset_id}/profile")
+        if err:
+            print("Failed to fetch profile:", err)
+            return {}
+        return data.get("columns", {})
+
+    @app.callback(
+        Output({"type":"filter-val-table","index":MATCH},"options"),
+        Input({"type":"filter-col-table","index":MATCH},"value"),
+        State("dataset_profile_store","data")
+    )
+    def fill_filter_values(column, profile):
+        stats = (profile or {}).get(column) or {}
+        return [
+            {"label": f"{t['value']} ({t['count']})", "value": t["value"]}
+            for t in (stats.get("top") or [])
+            if t["value"] is not None
+        ]
+
     @app.callback(
         Output("filters-table-container","children"),
         Output("filters-store","data"),
@@ -0,0 +1,408 @@
+# ingest.py
+# Streaming CSV ingestion for POST /api/datasets.
+#
+# The file is read block by block with pyarrow's multithreaded CSV reader,
+# so S3 bodies are never buffered whole and progress (bytes consumed) can be
+# reported while the load runs. Column types are inferred once from a
+# leading sample and then fixed for the rest of the stream.
+import io
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+CSV_BLOCK_SIZE = 8 * 1024 * 1024
+CSV_SAMPLE_BYTES = 4 * 1024 * 1024
+
+# Arrow's CSV defaults differ from pd.read_csv in two ways that change the
+# stored data: blank strings would stay "" (pandas reads NaN) and date-like
+# text would be parsed (pandas keeps it as text, see _sample_types).
+_CONVERT_DEFAULTS = dict(strings_can_be_null=True, timestamp_parsers=[])
+
+
+class CsvTypeMismatch(Exception):
+    """Raised when a column keeps contradicting its inferred type after retries."""
+
+
+class _ProgressReader(io.RawIOBase):
+    """Read-only stream over an already-read head plus the rest of raw, counting bytes."""
+
+    def __init__(self, raw, head: bytes, on_read: Callable[[int], None]):
+        self._raw = raw
+        self._head = memoryview(head)
+        self._on_read = on_read
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buf) -> int:
+        if len(self._head):
+            n = min(len(buf), len(self._head))
+            buf[:n] = self._head[:n]
+            self._head = self._head[n:]
+        else:
+            data = self._raw.read(len(buf))
+            n = len(data)
+            buf[:n] = data
+        if n:
+            self._on_read(n)
+        return n
+
+
+_BAD_COLUMN = re.compile(r"CSV column #(\d+)")
+
+
+def _sample_types(head: bytes, at_eof: bool) -> Dict[str, pa.DataType]:
+    """Infer column types from the leading sample, cut back to a whole line."""
+    if not at_eof:
+        cut = head.rfind(b"\n")
+        if cut > 0:
+            head = head[:cut + 1]
+    table = pacsv.read_csv(io.BytesIO(head), convert_options=pacsv.ConvertOptions(**_CONVERT_DEFAULTS))
+    return {
+        f.name: pa.string() if pa.types.is_temporal(f.type) else f.type
+        for f in table.schema
+    }
+
+
+def _widen(dtype: pa.DataType) -> pa.DataType:
+    # same promotions pd.read_csv ends up with: ints -> float64, else text
+    if pa.types.is_integer(dtype):
+        return pa.float64()
+    return pa.string()
+
+
+def iter_csv_batches(raw, types: Dict[str, pa.DataType], head: bytes = b"",
+                     block_size: int = CSV_BLOCK_SIZE,
+                     include_columns: Optional[List[str]] = None,
+                     on_read: Optional[Callable[[int], None]] = None) -> Iterator[pa.RecordBatch]:
+    """Record batches of a CSV stream parsed with fixed column types."""
+    reader = pacsv.open_csv(
+        _ProgressReader(raw, head, on_read or (lambda n: None)),
+        read_options=pacsv.ReadOptions(use_threads=True, block_size=block_size),
+        convert_options=pacsv.ConvertOptions(
+            column_types=types, include_columns=include_columns or [], **_CONVERT_DEFAULTS
+        ),
+    )
+    for batch in reader:
+        yield batch
+
+
+def _read_stream(raw, types: Dict[str, pa.DataType], head: bytes, block_size: int,
+                 on_progress: Optional[Callable[[int, int], None]]) -> pa.Table:
+    counters = {"bytes": 0, "rows": 0}
+
+    def on_read(n: int):
+        counters["bytes"] += n
+
+    batches = []
+    schema = None
+    for batch in iter_csv_batches(raw, types, head, block_size, on_read=on_read):
+        batches.append(batch)
+        schema = batch.schema
+        counters["rows"] += batch.num_rows
+        if on_progress:
+            on_progress(counters["bytes"], counters["rows"])
+    if schema is None:
+        schema = pa.schema([pa.field(name, dtype) for name, dtype in types.items()])
+    table = pa.Table.from_batches(batches, schema=schema)
+    del batches
+    return table.combine_chunks()
+
+
+def _with_retries(open_stream: Callable[[], Any], read: Callable, sample_bytes: int, max_retries: int):
+    """
+    Call read(raw, types, head) on a fresh stream, widening the column named
+    in a conversion error and starting over (up to max_retries times).
+    """
+    types = None
+    error = None
+    for _ in range(max_retries + 1):
+        raw = open_stream()
+        try:
+            head = raw.read(sample_bytes)
+            if not head:
+                return None
+            if types is None:
+                types = _sample_types(head, len(head) < sample_bytes)
+            try:
+                return read(raw, types, head)
+            except pa.ArrowInvalid as e:
+                m = _BAD_COLUMN.search(str(e))
+                if m is None or int(m.group(1)) >= len(types):
+                    raise CsvTypeMismatch(str(e)) from e
+                name = list(types)[int(m.group(1))]
+                if types[name] == pa.string():
+                    raise CsvTypeMismatch(str(e)) from e
+                types[name] = _widen(types[name])
+                error = e
+        finally:
+            close = getattr(raw, "close", None)
+            if close:
+                close()
+    raise CsvTypeMismatch(str(error))
+
+
+def read_csv_table(open_stream: Callable[[], Any],
+                   on_progress: Optional[Callable[[int, int], None]] = None,
+                   block_size: int = CSV_BLOCK_SIZE,
+                   sample_bytes: int = CSV_SAMPLE_BYTES,
+                   max_retries: int = 3) -> pa.Table:
+    """
+    Read a CSV into a pa.Table with one chunk per column.
+
+    open_stream() must return a fresh binary stream each time it is called:
+    when a later block contradicts a sampled type, that column is widened
+    and the file is read again from the start. on_progress(bytes_read,
+    rows_read) is called after every block.
+    """
+    table = _with_retries(
+        open_stream,
+        lambda raw, types, head: _read_stream(raw, types, head, block_size, on_progress),
+        sample_bytes, max_retries,
+    )
+    return pa.table({}) if table is None else table
+
+
+def scan_csv_types(open_stream: Callable[[], Any],
+                   on_progress: Optional[Callable[[int, int], None]] = None,
+                   block_size: int = CSV_BLOCK_SIZE,
+                   sample_bytes: int = CSV_SAMPLE_BYTES,
+                   max_retries: int = 3) -> Tuple[Dict[str, pa.DataType], int]:
+    """
+    One pass over a CSV without keeping it: the column types that parse the
+    whole file (integer columns with blanks become float64, as pandas reads
+    them) and the row count.
+    """
+    def read(raw, types, head):
+        counters = {"bytes": 0, "rows": 0}
+        has_nulls = set()
+
+        def on_read(n: int):
+            counters["bytes"] += n
+
+        for batch in iter_csv_batches(raw, types, head, block_size, on_read=on_read):
+            counters["rows"] += batch.num_rows
+            for name, col in zip(batch.schema.names, batch.columns):
+                if col.null_count:
+                    has_nulls.add(name)
+            if on_progress:
+                on_progress(counters["bytes"], counters["rows"])
+        final = {
+            name: pa.float64() if name in has_nulls and pa.types.is_integer(dtype) else dtype
+            for name, dtype in types.items()
+        }
+        return final, counters["rows"]
+
+    result = _with_retries(open_stream, read, sample_bytes, max_retries)
+    return ({}, 0) if result is None else result
+
+
+def concat_parts(tables: List[pa.Table]) -> pa.Table:
+    """
+    Stack part files that were parsed independently. Columns whose inferred
+    types disagree are promoted (int + float -> float) or, when that is not
+    possible, read as text; columns missing from a part are null there.
+    The parts' buffers are referenced, not copied.
+    """
+    tables = [t for t in tables if t.num_columns]
+    if not tables:
+        return pa.table({})
+    try:
+        return pa.concat_tables(tables, promote_options="permissive")
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        pass
+    seen: Dict[str, set] = {}
+    for t in tables:
+        for f in t.schema:
+            seen.setdefault(f.name, set()).add(f.type)
+    conflicts = {
+        name for name, types in seen.items()
+        if len(types - {pa.null()}) > 1
+        and not all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in types - {pa.null()})
+    }
+    tables = [
+        pa.Table.from_arrays(
+            [col.cast(pa.string()) if name in conflicts else col
+             for name, col in zip(t.column_names, t.columns)],
+            names=t.column_names,
+        )
+        for t in tables
+    ]
+    return pa.concat_tables(tables, promote_options="permissive")
+
+
+# -----------------------------
+# Ingest-time dtype optimization
+# -----------------------------
+_DATE_FORMATS = ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S")
+
+
+def _index_type(n: int) -> pa.DataType:
+    for dtype, limit in ((pa.int8(), 2 ** 7), (pa.int16(), 2 ** 15)):
+        if n < limit:
+            return dtype
+    return pa.int32()
+
+
+def _smallest_int(col: pa.ChunkedArray) -> Optional[pa.DataType]:
+    bounds = pc.min_max(col).as_py()
+    lo, hi = bounds["min"], bounds["max"]
+    if lo is None:
+        return None
+    for dtype in (pa.int8(), pa.int16(), pa.int32()):
+        info = np.iinfo(dtype.to_pandas_dtype())
+        if info.min <= lo and hi <= info.max:
+            return dtype
+    return None
+
+
+def _parse_dates(col: pa.ChunkedArray) -> Optional[Tuple[pa.ChunkedArray, str]]:
+    """Timestamps for a text column whose every value is one strict date format."""
+    sample = pc.drop_null(col).slice(0, 1000)
+    if not len(sample):
+        return None
+    for fmt in _DATE_FORMATS:
+        try:
+            pc.strptime(sample, format=fmt, unit="s")
+            parsed = pc.strptime(col, format=fmt, unit="s")
+            # strptime accepts e.g. "2020-1-1"; only exact round trips keep labels intact
+            if not pc.all(pc.equal(pc.strftime(parsed, format=fmt), col)).as_py():
+                continue
+            return parsed.cast(pa.timestamp("ns")), fmt
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            continue
+    return None
+
+
+def _dtype_name(dtype: pa.DataType) -> str:
+    """The pandas dtype a column of this Arrow type attaches as."""
+    if pa.types.is_dictionary(dtype):
+        return "category"
+    if pa.types.is_timestamp(dtype):
+        return f"datetime64[{dtype.unit}]"
+    if pa.types.is_string(dtype) or pa.types.is_large_string(dtype):
+        return "string"
+    try:
+        return str(np.dtype(dtype.to_pandas_dtype()))
+    except (NotImplementedError, TypeError):
+        return str(dtype)
+
+
+def optimize_table(table: pa.Table, category_max_ratio: float = 0.5) -> Tuple[pa.Table, Dict[str, Any]]:
+    """
+    Shrink a freshly loaded table before it is stored:
+      - text columns that hold only ISO-like dates become timestamps,
+      - text columns with few distinct values become dictionary-encoded
+        (pandas categoricals),
+      - integer columns are downcast to the smallest type holding their range.
+    Floats are left alone (float32 would change sums). Returns the table and
+    a report with memory before/after, per-column dtypes and the formats of
+    parsed date columns (so their keys can be printed back unchanged).
+    """
+    before = table.nbytes
+    n = table.num_rows
+    columns, date_formats = [], {}
+    for name, col in zip(table.column_names, table.columns):
+        if pa.types.is_string(col.type) or pa.types.is_large_string(col.type):
+            parsed = _parse_dates(col)
+            if parsed is not None:
+                col, date_formats[name] = parsed
+            else:
+                distinct = pc.count_distinct(col).as_py()
+                if n and distinct <= max(1, category_max_ratio * n) and distinct < 2 ** 31:
+                    col = pc.dictionary_encode(col).cast(pa.dictionary(_index_type(distinct), col.type))
+        elif pa.types.is_integer(col.type) and col.type.bit_width > 8 and not col.null_count:
+            dtype = _smallest_int(col)
+            if dtype is not None and dtype.bit_width < col.type.bit_width:
+                col = col.cast(dtype)
+        columns.append(col)
+    out = pa.Table.from_arrays(columns, names=table.column_names)
+    report = {
+        "memory_before": before,
+        "memory_after": out.nbytes,
+        "dtypes": {f.name: _dtype_name(f.type) for f in out.schema},
+        "date_formats": date_formats,
+    }
+    return out, report
+
+
+def restore_table(table: pa.Table, date_formats: Optional[Dict[str, str]] = None) -> pa.Table:
+    """
+    Undo optimize_table's encodings (dates back to their source text,
+    dictionaries decoded) so stored rows concatenate with freshly read parts.
+    Downcast integers are left as they are; concatenation widens them.
+    """
+    date_formats = date_formats or {}
+    columns = []
+    for name, col in zip(table.column_names, table.columns):
+        if name in date_formats and pa.types.is_timestamp(col.type):
+            col = pc.strftime(col, format=date_formats[name])
+        elif pa.types.is_dictionary(col.type):
+            col = col.cast(col.type.value_type)
+        columns.append(col)
+    return pa.Table.from_arrays(columns, names=table.column_names)
+
+
+class IngestProgress:
+    """Thread-safe registry of running and finished loads, keyed by dataset id."""
+
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def start(self, dataset_id: str, total_bytes: Optional[int] = None):
+        with self._lock:
+            self._jobs[dataset_id] = {
+                "id": dataset_id,
+                "status": "loading",
+                "bytes_read": 0,
+                "total_bytes": total_bytes,
+                "rows_read": 0,
+                "started": time.time(),
+                "finished": None,
+                "error": None,
+            }
+
+    def update(self, dataset_id: str, bytes_read: int, rows_read: int):
+        with self._lock:
+            job = self._jobs.get(dataset_id)
+            if job is not None:
+                job["bytes_read"] = bytes_read
+                job["rows_read"] = rows_read
+
+    def set_total(self, dataset_id: str, total_bytes: Optional[int]):
+        with self._lock:
+            job = self._jobs.get(dataset_id)
+            if job is not None:
+                job["total_bytes"] = total_bytes
+
+    def finish(self, dataset_id: str, error: Optional[str] = None):
+        with self._lock:
+            job = self._jobs.get(dataset_id)
+            if job is not None:
+                job["status"] = "failed" if error else "ready"
+                job["error"] = error
+                job["finished"] = time.time()
+
+    def get(self, dataset_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(dataset_id)
+            if job is None:
+                return None
+            out = dict(job)
+        end = out["finished"] or time.time()
+        out["elapsed_s"] = round(end - out["started"], 3)
+        total = out["total_bytes"]
+        if out["status"] == "ready":
+            out["percent"] = 100.0
+        elif total:
+            out["percent"] = round(min(out["bytes_read"] / total, 1.0) * 100, 1)
+        else:
+            out["percent"] = None
+        return out
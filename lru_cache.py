@@ -0,0 +1,72 @@
+# lru_cache.py
+# Thread-safe least-recently-used map bounded by a size budget, shared by the
+# pivot result, column index, lazy column, calculated column and formula plan
+# caches. Sizes are in the caller's unit: bytes, or 1 per entry.
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Collection, Hashable, List, Tuple
+
+
+class LRUCache:
+    """
+    key -> (value, size), evicting the least recently used entries once the
+    sizes add up to more than max_size. lock is reentrant so owners can
+    combine several calls with their own bookkeeping atomically.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self.size = 0
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, size: int, pinned: Collection[Hashable] = ()) -> bool:
+        """
+        Store value as the most recent entry, then evict until within budget,
+        never evicting key or pinned keys. An entry larger than the whole
+        budget is not stored (False) unless it is pinned.
+        """
+        with self.lock:
+            if size > self.max_size and key not in pinned:
+                return False
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._entries[key] = (value, size)
+            self.size += size
+            if self.size > self.max_size:
+                for victim in list(self._entries):
+                    if self.size <= self.max_size:
+                        break
+                    if victim == key or victim in pinned:
+                        continue
+                    self.size -= self._entries.pop(victim)[1]
+                    self.evictions += 1
+            return True
+
+    def discard(self, match: Callable[[Hashable], bool]):
+        """Drop every entry whose key matches (not counted as evictions)."""
+        with self.lock:
+            for key in [k for k in self._entries if match(k)]:
+                self.size -= self._entries.pop(key)[1]
+
+    def items(self) -> List[Tuple[Hashable, Any, int]]:
+        """Snapshot of (key, value, size), least recently used first."""
+        with self.lock:
+            return [(key, value, size) for key, (value, size) in self._entries.items()]
@@ -0,0 +1,364 @@
+# pivot_engine.py
+# Factorize + bincount aggregation engine for /api/pivot.
+#
+# Produces the same frame as
+#   pd.pivot_table(df, index=rows, columns=cols, values=values,
+#                  aggfunc=agg_dict, fill_value=0, dropna=False)
+# but computes every measure in one vectorized pass over integer group ids
+# instead of one groupby per measure.
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from lru_cache import LRUCache
+
+# Guard against cartesian grids that would not fit in memory
+MAX_GROUPS = 20_000_000
+
+_KERNELS = {"sum", "mean", "count", "min", "max", "nunique"}
+
+
+class UnsupportedPivot(Exception):
+    """Raised when a request needs the pandas engine (caller falls back)."""
+
+
+def _kernel_name(agg) -> str:
+    if agg is pd.Series.nunique:
+        return "nunique"
+    if isinstance(agg, str) and agg in _KERNELS:
+        return agg
+    raise UnsupportedPivot(f"aggfunc {agg!r}")
+
+
+def factorize_dimension(s: pd.Series) -> Tuple[np.ndarray, pd.Index]:
+    """
+    Sorted dictionary encoding of one dimension column.
+    Nulls get their own trailing code, like groupby(dropna=False).
+    """
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        # grouped by value like the plain column it was encoded from:
+        # observed categories only, in sorted order
+        cats = s.cat.categories
+        codes = np.asarray(s.cat.codes, dtype=np.int64)
+        present = np.bincount(codes[codes >= 0], minlength=len(cats)) > 0
+        order = [i for i in cats.argsort() if present[i]]
+        remap = np.full(len(cats) + 1, -1, dtype=np.int64)
+        remap[order] = np.arange(len(order))
+        codes = remap[codes]
+        uniques = pd.Index(np.asarray(cats)[order], dtype=cats.dtype)
+    else:
+        codes, uniques = pd.factorize(s, sort=True)
+        codes = np.asarray(codes, dtype=np.int64)
+        uniques = pd.Index(uniques)
+    missing = codes < 0
+    if missing.any():
+        codes = np.where(missing, len(uniques), codes)
+        uniques = uniques.insert(len(uniques), np.nan)
+    return codes, uniques
+
+
+# -----------------------------
+# Cached dictionary encodings
+# -----------------------------
+def _code_dtype(n: int) -> np.dtype:
+    for dtype in (np.int8, np.int16, np.int32):
+        if n <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+class ColumnIndex:
+    """
+    Dictionary encoding of one stored column: sorted uniques (null last) and
+    one small-int code per row. blanks_merged is set when blank strings were
+    collapsed to a single key, i.e. the codes are only valid for grouping.
+    """
+
+    __slots__ = ("codes", "uniques", "blanks_merged", "nbytes")
+
+    def __init__(self, codes: np.ndarray, uniques: pd.Index, blanks_merged: bool = False):
+        self.codes = codes.astype(_code_dtype(len(uniques)), copy=False)
+        self.uniques = uniques
+        self.blanks_merged = blanks_merged
+        self.nbytes = int(self.codes.nbytes + uniques.memory_usage(deep=True))
+
+    def take(self, positions: Optional[np.ndarray] = None) -> Tuple[np.ndarray, pd.Index]:
+        """Codes for a row subset, re-numbered so only observed keys remain."""
+        if positions is None:
+            return self.codes, self.uniques
+        sub = self.codes[positions]
+        present = np.bincount(sub, minlength=len(self.uniques)) > 0
+        if present.all():
+            return sub, self.uniques
+        remap = np.cumsum(present) - 1
+        return remap[sub], self.uniques[present]
+
+
+def build_column_index(s: pd.Series, blanks_merged: bool = False) -> Optional[ColumnIndex]:
+    codes, uniques = factorize_dimension(s)
+    return ColumnIndex(codes, uniques, blanks_merged)
+
+
+class ColumnIndexCache:
+    """Thread-safe LRU of ColumnIndex objects keyed by (dataset_id, column, version)."""
+
+    def __init__(self, max_bytes: int):
+        self._lru = LRUCache(max_bytes)
+        self.builds = 0
+
+    def get(self, dataset_id: str, column: str, build: Callable[[], Optional[ColumnIndex]],
+            version: int = 0) -> Optional[ColumnIndex]:
+        key = (dataset_id, column, version)
+        index = self._lru.get(key)
+        if index is not None:
+            return index
+        index = build()
+        if index is not None and self._lru.put(key, index, index.nbytes):
+            with self._lru.lock:
+                self.builds += 1
+        return index
+
+    def drop(self, dataset_id: str):
+        """Forget every index built for dataset_id."""
+        self._lru.discard(lambda key: key[0] == dataset_id)
+
+    def stats(self) -> Dict[str, object]:
+        lru = self._lru
+        with lru.lock:
+            per_dataset: Dict[str, Dict[str, int]] = {}
+            for (ds, col, _), _, size in lru.items():
+                per_dataset.setdefault(ds, {})[col] = size
+            return {
+                "bytes": lru.size,
+                "max_bytes": lru.max_size,
+                "builds": self.builds,
+                "hits": lru.hits,
+                "evictions": lru.evictions,
+                "datasets": per_dataset,
+            }
+
+
+# Optional per-column encoder: (column, raw) -> (codes, uniques) or None.
+# raw=True asks for an encoding of the untouched values (no blank merging).
+Encoder = Callable[[str, bool], Optional[Tuple[np.ndarray, pd.Index]]]
+
+
+def _group_ids(df: pd.DataFrame, dims: List[str],
+               encode: Optional[Encoder] = None) -> Tuple[np.ndarray, List[pd.Index], int]:
+    """Combine per-dimension codes into one mixed-radix group id."""
+    gid = np.zeros(len(df), dtype=np.int64)
+    levels = []
+    size = 1
+    for col in dims:
+        encoded = encode(col, False) if encode else None
+        codes, uniques = encoded if encoded is not None else factorize_dimension(df[col])
+        n = max(len(uniques), 1)
+        if size * n > MAX_GROUPS:
+            raise UnsupportedPivot("too many groups")
+        gid = gid * n + codes
+        size *= n
+        levels.append(uniques)
+    return gid, levels, size
+
+
+def _fits(values: np.ndarray, dtype: np.dtype) -> bool:
+    if values.size == 0:
+        return True
+    info = np.iinfo(dtype)
+    return values.min() >= info.min and values.max() <= info.max
+
+
+def _aggregate(s: pd.Series, kernel: str, gid: np.ndarray, size: int,
+               encoded: Optional[Tuple[np.ndarray, pd.Index]] = None) -> np.ndarray:
+    """One measure over every group; cells without rows come back as 0."""
+    if kernel == "nunique":
+        if encoded is not None:
+            codes, uniques = encoded
+            valid = ~np.asarray(pd.isna(uniques))[codes]
+        else:
+            codes, uniques = pd.factorize(s)
+            valid = codes >= 0
+        n = max(len(uniques), 1)
+        if size * n >= 2 ** 62:
+            raise UnsupportedPivot("nunique key overflow")
+        pairs = np.unique(gid[valid] * n + codes[valid])
+        return np.bincount(pairs // n, minlength=size).astype(np.int64)
+
+    if kernel == "count":
+        # non-null values only, like pd.pivot_table's count. Before this
+        # engine, null strings in measures were filled as "__NULL__" and
+        # counted; null cells (None, NaN, NaT, NA) are now skipped.
+        return np.bincount(gid[s.notna().to_numpy()], minlength=size).astype(np.int64)
+
+    dtype = s.dtype
+    if not isinstance(dtype, np.dtype) or dtype.kind not in "iuf":
+        raise UnsupportedPivot(f"dtype {dtype}")
+    arr = s.to_numpy()
+    if dtype.kind == "f":
+        valid = ~np.isnan(arr)
+        g, v = gid[valid], arr[valid]
+    else:
+        g, v = gid, arr
+    counts = np.bincount(g, minlength=size)
+
+    if kernel == "sum":
+        if dtype.kind == "f":
+            return np.bincount(g, weights=v, minlength=size).astype(dtype, copy=False)
+        wide = np.uint64 if dtype.kind == "u" else np.int64
+        out = np.zeros(size, dtype=wide)
+        np.add.at(out, g, v.astype(wide, copy=False))
+        return out.astype(dtype) if _fits(out, dtype) else out
+
+    if kernel == "mean":
+        sums = np.bincount(g, weights=v, minlength=size)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out = np.where(counts > 0, sums / np.maximum(counts, 1), 0.0)
+        return out.astype(dtype if dtype.kind == "f" else np.float64, copy=False)
+
+    # min / max
+    if dtype.kind == "f":
+        out = np.full(size, np.inf if kernel == "min" else -np.inf, dtype=dtype)
+    else:
+        info = np.iinfo(dtype)
+        out = np.full(size, info.max if kernel == "min" else info.min, dtype=dtype)
+    (np.minimum if kernel == "min" else np.maximum).at(out, g, v)
+    out[counts == 0] = 0
+    return out
+
+
+def bincount_pivot_table(df: pd.DataFrame, rows: List[str], columns: List[str],
+                         values: List[str], aggfunc: Dict[str, object],
+                         encode: Optional[Encoder] = None) -> pd.DataFrame:
+    """
+    Drop-in for pd.pivot_table(..., fill_value=0, dropna=False) with a dict
+    aggfunc. Raises UnsupportedPivot for shapes/aggs it does not cover.
+    encode, when given, supplies (cached) dictionary codes aligned with df.
+    """
+    if not rows or not values:
+        raise UnsupportedPivot("needs row dimensions and values")
+    dims = list(rows) + list(columns)
+    if len(set(dims)) != len(dims) or len(set(values)) != len(values) or set(dims) & set(values):
+        raise UnsupportedPivot("overlapping dimensions/values")
+    missing = [c for c in dims + list(values) if c not in df.columns]
+    if missing:
+        raise KeyError(missing[0])
+    kernels = {v: _kernel_name(aggfunc[v]) for v in values}
+
+    row_gid, row_levels, n_rows = _group_ids(df, rows, encode)
+    col_gid, col_levels, n_cols = _group_ids(df, columns, encode)
+    if n_rows * n_cols > MAX_GROUPS:
+        raise UnsupportedPivot("too many groups")
+    gid = row_gid * n_cols + col_gid
+    size = n_rows * n_cols
+
+    if len(rows) == 1:
+        index = row_levels[0].rename(rows[0])
+    else:
+        index = pd.MultiIndex.from_product(row_levels, names=rows)
+
+    def measure(v):
+        encoded = encode(v, True) if encode and kernels[v] == "nunique" else None
+        return _aggregate(df[v], kernels[v], gid, size, encoded)
+
+    ordered = sorted(values)
+    if not columns:
+        return pd.DataFrame({v: measure(v) for v in ordered}, index=index)
+
+    col_index = pd.MultiIndex.from_product(col_levels, names=columns)
+    blocks = []
+    for v in ordered:
+        grid = measure(v).reshape(n_rows, n_cols)
+        block = pd.DataFrame(grid, index=index, columns=col_index)
+        block.columns = pd.MultiIndex.from_tuples(
+            [(v,) + (k if isinstance(k, tuple) else (k,)) for k in block.columns],
+            names=[None] + list(columns),
+        )
+        blocks.append(block)
+    return pd.concat(blocks, axis=1)
+
+
+# -----------------------------
+# Mergeable partial aggregates (out-of-core pivots)
+# -----------------------------
+_MERGEABLE = {"sum", "count", "min", "max", "mean"}
+
+
+class StreamingAggregator:
+    """
+    Folds record batches into per-group partial aggregates (sum, count,
+    min, max; mean as sum + count). Partials of successive batches are
+    re-grouped once they exceed compact_rows, so memory stays bounded by
+    one batch plus the number of groups.
+    """
+
+    def __init__(self, dims: List[str], kernels: Dict[str, str], compact_rows: int = 1_000_000):
+        unsupported = {v: k for v, k in kernels.items() if k not in _MERGEABLE}
+        if unsupported:
+            raise UnsupportedPivot(f"aggfunc not mergeable: {unsupported}")
+        if not dims:
+            raise UnsupportedPivot("needs at least one dimension")
+        self.dims = list(dims)
+        self.kernels = dict(kernels)
+        self.compact_rows = compact_rows
+        self._merge = {("", "__rows__"): "sum"}
+        for v, k in self.kernels.items():
+            for part in ("sum", "count") if k == "mean" else (k,):
+                self._merge[(v, part)] = "sum" if part == "count" else part
+        self._parts: List[pd.DataFrame] = []
+        self._rows = 0
+        self.batches = 0
+
+    def add(self, df: pd.DataFrame):
+        if not len(df):
+            return
+        g = df.groupby(self.dims, dropna=False, sort=False)
+        cols = {("", "__rows__"): g.size()}
+        for (v, part) in self._merge:
+            if v:
+                cols[(v, part)] = getattr(g[v], part)()
+        part = pd.DataFrame(cols)
+        self._parts.append(part)
+        self._rows += len(part)
+        self.batches += 1
+        if self._rows > self.compact_rows:
+            self._compact()
+
+    def _compact(self):
+        if len(self._parts) > 1:
+            merged = pd.concat(self._parts)
+            merged = merged.groupby(level=list(range(len(self.dims))), dropna=False, sort=False).agg(self._merge)
+            self._parts = [merged]
+        self._rows = sum(len(p) for p in self._parts)
+
+    def result(self, dims: Optional[List[str]] = None) -> Tuple[pd.DataFrame, Dict[str, str]]:
+        """
+        One row per observed group (dims + one column per value) and the
+        aggfunc that turns those rows into the same pivot as the raw rows.
+        dims, a subset of the aggregator's dimensions, merges the partials
+        into coarser groups (none: one row for everything, e.g. totals).
+        """
+        self._compact()
+        dims = self.dims if dims is None else list(dims)
+        if not self._parts:
+            return pd.DataFrame(columns=dims + list(self.kernels)), {
+                v: ("sum" if k == "count" else k) for v, k in self.kernels.items()
+            }
+        merged = self._parts[0]
+        if dims != self.dims:
+            if dims:
+                levels = [self.dims.index(d) for d in dims]
+                merged = merged.groupby(level=levels, dropna=False, sort=False).agg(self._merge)
+            else:
+                merged = merged.groupby(np.zeros(len(merged), dtype=np.int8)).agg(self._merge)
+        out = {}
+        for v, k in self.kernels.items():
+            if k == "mean":
+                counts = merged[(v, "count")]
+                out[v] = merged[(v, "sum")] / counts.where(counts > 0)
+            else:
+                out[v] = merged[(v, k)]
+        final = pd.DataFrame(out, index=merged.index).reset_index(drop=not dims)
+        # every group is one row now: sums and counts add up, the rest pass through
+        aggs = {v: ("sum" if k == "count" else k) for v, k in self.kernels.items()}
+        return final, aggs
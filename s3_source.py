@@ -0,0 +1,185 @@
+# s3_source.py
+# S3 access for dataset registration: one pooled client per process and
+# concurrent, ranged downloads of every part file under a prefix.
+#
+# Set S3_ENDPOINT_URL to point boto3 at a local S3 (moto server, MinIO), or
+# S3_LOCAL_ROOT to serve buckets from <root>/<bucket>/<key> on disk via
+# FilesystemS3Client, which has the small subset of the client API used here.
+import datetime
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import boto3
+from botocore.config import Config
+
+S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", 16))
+S3_PART_SIZE = int(os.getenv("S3_PART_SIZE", 16 * 1024 * 1024))
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class S3Object(NamedTuple):
+    key: str
+    size: int
+    etag: str = ""   # changes whenever the object is rewritten
+
+
+class FilesystemS3Client:
+    """Filesystem-backed stand-in for the boto3 S3 client (list + ranged get)."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, bucket: str, key: str) -> str:
+        return os.path.join(self.root, bucket, *key.split("/"))
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = "", ContinuationToken: Optional[str] = None,
+                        **_) -> Dict[str, Any]:
+        base = os.path.join(self.root, Bucket)
+        contents = []
+        for dirpath, _, files in os.walk(base):
+            for name in files:
+                path = os.path.join(dirpath, name)
+                key = os.path.relpath(path, base).replace(os.sep, "/")
+                if key.startswith(Prefix):
+                    st = os.stat(path)
+                    contents.append({
+                        "Key": key,
+                        "Size": st.st_size,
+                        "ETag": f'"{st.st_mtime_ns:x}-{st.st_size:x}"',
+                        "LastModified": datetime.datetime.fromtimestamp(st.st_mtime, datetime.timezone.utc),
+                    })
+        contents.sort(key=lambda c: c["Key"])
+        return {"Contents": contents, "KeyCount": len(contents), "IsTruncated": False}
+
+    def get_object(self, Bucket: str, Key: str, Range: Optional[str] = None, **_) -> Dict[str, Any]:
+        path = self._path(Bucket, Key)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"s3://{Bucket}/{Key}")
+        size = os.path.getsize(path)
+        if Range is None:
+            return {"Body": open(path, "rb"), "ContentLength": size}
+        start, end = (int(x) for x in Range[len("bytes="):].split("-"))
+        with open(path, "rb") as fh:
+            fh.seek(start)
+            data = fh.read(end - start + 1)
+        return {"Body": io.BytesIO(data), "ContentLength": len(data)}
+
+
+def get_client():
+    """Process-wide S3 client; boto3 clients are thread-safe and pool connections."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            local_root = os.getenv("S3_LOCAL_ROOT")
+            if local_root:
+                _client = FilesystemS3Client(local_root)
+            else:
+                _client = boto3.client(
+                    "s3",
+                    endpoint_url=os.getenv("S3_ENDPOINT_URL") or None,
+                    config=Config(max_pool_connections=S3_MAX_CONCURRENCY),
+                )
+        return _client
+
+
+def _is_data_file(key: str) -> bool:
+    # skip "directories" and job markers such as _SUCCESS or .part.crc
+    name = key.rsplit("/", 1)[-1]
+    return bool(name) and not name.startswith(("_", "."))
+
+
+def _etag(item: Dict[str, Any]) -> str:
+    etag = (item.get("ETag") or "").strip('"')
+    if etag:
+        return etag
+    return f"{item.get('LastModified', '')}-{item['Size']}"
+
+
+def list_objects(client, bucket: str, key: str) -> List[S3Object]:
+    """
+    The object at key if it exists, otherwise every data file under key
+    treated as a prefix (in key order).
+    """
+    objects, token = [], None
+    while True:
+        kwargs = {"Bucket": bucket, "Prefix": key}
+        if token:
+            kwargs["ContinuationToken"] = token
+        page = client.list_objects_v2(**kwargs)
+        for item in page.get("Contents", []):
+            if item["Key"] == key:
+                return [S3Object(item["Key"], int(item["Size"]), _etag(item))]
+            if _is_data_file(item["Key"]) and int(item["Size"]) > 0:
+                objects.append(S3Object(item["Key"], int(item["Size"]), _etag(item)))
+        if not page.get("IsTruncated"):
+            break
+        token = page["NextContinuationToken"]
+    return objects
+
+
+def _get_range(client, bucket: str, key: str, start: int, end: int, out: memoryview):
+    body = client.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}")["Body"]
+    try:
+        pos = 0
+        while pos < len(out):
+            chunk = body.read(min(1024 * 1024, len(out) - pos))
+            if not chunk:
+                raise IOError(f"short read on s3://{bucket}/{key} at byte {start + pos}")
+            out[pos:pos + len(chunk)] = chunk
+            pos += len(chunk)
+    finally:
+        body.close()
+
+
+def fetch_objects(client, bucket: str, objects: List[S3Object],
+                  on_object: Callable[[S3Object, memoryview], None],
+                  on_bytes: Optional[Callable[[int], None]] = None,
+                  part_size: int = S3_PART_SIZE,
+                  max_concurrency: int = S3_MAX_CONCURRENCY):
+    """
+    Download every object with up to max_concurrency ranged GETs in flight.
+    Each object is written into one preallocated buffer (no joining of
+    parts) and handed to on_object as soon as its last range arrives;
+    on_object runs on the download threads and may be called concurrently.
+    """
+    # ranges are queued in object order, so only the objects currently being
+    # downloaded hold a buffer
+    buffers: Dict[str, bytearray] = {}
+    remaining = {}
+    ranges = []
+    for obj in objects:
+        parts = [(start, min(start + part_size, obj.size) - 1) for start in range(0, obj.size, part_size)]
+        remaining[obj.key] = len(parts)
+        ranges.extend((obj, start, end) for start, end in parts)
+    lock = threading.Lock()
+
+    def fetch(obj: S3Object, start: int, end: int):
+        with lock:
+            if obj.key not in buffers:
+                buffers[obj.key] = bytearray(obj.size)
+            buf = buffers[obj.key]
+        _get_range(client, bucket, obj.key, start, end, memoryview(buf)[start:end + 1])
+        if on_bytes:
+            on_bytes(end - start + 1)
+        with lock:
+            remaining[obj.key] -= 1
+            done = remaining[obj.key] == 0
+            if done:
+                buffers.pop(obj.key)
+        if done:
+            on_object(obj, memoryview(buf))
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="s3") as pool:
+        futures = [pool.submit(fetch, *r) for r in ranges]
+        try:
+            for f in as_completed(futures):
+                f.result()
+        except BaseException:
+            for f in futures:
+                f.cancel()
+            raise